@@ -0,0 +1,125 @@
+import numpy as np
+import traces
+
+#two-moment (QNA, Whitt 1983) approximation of FIFO tandem lines with general arrival and service distributions,
+#vectorized over a grid of configurations for screening before simulating.
+#every queue is a GI/G/c queue: Wq = (ca^2 + cs^2) / 2 * Wq(M/M/c) (Kingman for c = 1, Allen-Cunneen for c > 1)
+#and its departures, the arrivals of the next queue, have scv cd^2 = 1 + (1 - rho^2)(ca^2 - 1) + rho^2 (cs^2 - 1) / sqrt(c).
+#with exponential arrivals and services ca^2 = cs^2 = 1 everywhere and the values are the Jackson ones
+
+
+#(mean, squared coefficient of variation) of a distribution dict
+def distribution_moments(distribution):
+    distribution_type = distribution['type']
+    params = distribution['params']
+
+    if distribution_type == 'uniform':
+        # U(0, 1)
+        return 0.5, 1 / 3
+    elif distribution_type == 'exponential':
+        return 1 / params.get('rate', 1.0), 1.0
+    elif distribution_type == 'erlang':
+        k = params.get('k', 1)
+        return k / params.get('rate', 1.0), 1 / k
+    elif distribution_type == 'hyperexponential':
+        rates = np.array(params.get('rates', [1.0, 2.0]))
+        probs = np.array(params.get('probs', [0.5, 0.5]))
+        probs = probs / probs.sum()
+        mean = np.sum(probs / rates)
+        second_moment = np.sum(2 * probs / rates**2)
+        return float(mean), float(second_moment / mean**2 - 1)
+    elif distribution_type == 'hypoexponential':
+        rates = np.array(params.get('rates', [1.0, 2.0]))
+        mean = np.sum(1 / rates)
+        return float(mean), float(np.sum(1 / rates**2) / mean**2)
+    elif distribution_type == 'empirical':
+        # moments of the piecewise linear inverse cdf
+        quantiles = np.asarray(params['quantiles'], dtype=np.float64)
+        probs = np.asarray(params.get('probs', np.linspace(0, 1, len(quantiles))), dtype=np.float64)
+        widths = np.diff(probs)
+        mean = np.sum(widths * (quantiles[:-1] + quantiles[1:]) / 2)
+        second_moment = np.sum(widths * (quantiles[:-1]**2 + quantiles[:-1] * quantiles[1:] + quantiles[1:]**2) / 3)
+        return float(mean), float(second_moment / mean**2 - 1)
+    elif distribution_type == 'trace':
+        # sample moments of at most 10^7 evenly strided rows
+        times = traces.read_trace(distribution, 0, traces.trace_length(distribution))
+        stride = max(1, -(-len(times) // 10**7))
+        times = np.asarray(times[::stride], dtype=np.float64)
+        return float(times.mean()), float(times.var() / times.mean()**2)
+    else:
+        raise ValueError("Unsupported distribution type.")
+
+#Erlang C (see tandemqueuesimulator2.erlang_c) for arrays of server counts and offered loads
+def erlang_c(num_servers, offered_load):
+    num_servers = np.asarray(num_servers)
+    offered_load = np.asarray(offered_load, dtype=np.float64)
+    utilization = offered_load / num_servers
+    term = np.ones_like(offered_load)
+    terms_sum = np.zeros_like(offered_load)
+    for k in range(int(num_servers.max())):
+        active = k < num_servers
+        terms_sum = np.where(active, terms_sum + term, terms_sum)
+        term = np.where(active, term * offered_load / (k + 1), term)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        waiting_term = term / (1 - utilization)
+        probability = waiting_term / (terms_sum + waiting_term)
+    return np.where(utilization >= 1, 1.0, probability)
+
+
+#QNA values of experiments (run_replication style dicts, see sweep.grid) with the same number of queues, as arrays
+#over the experiments: per queue (num_experiments, num_queues) utilization, mean_jobcounts, mean_soujorntime_perqueue,
+#wait_times and arrival_scvs, per experiment throughput, overall_mean_jobcount and overall_mean_soujorntime.
+#unstable queues (utilization >= 1) get inf
+def screen(experiments):
+    num_queues = experiments[0].get('num_queues', 2)
+    if any(experiment.get('num_queues', 2) != num_queues for experiment in experiments):
+        raise ValueError("screen needs experiments with the same number of queues")
+    arrival_moments = np.array([distribution_moments(experiment['arrival_distributions'][0]) for experiment in experiments])
+    service_moments = np.array([[distribution_moments(distribution) for distribution in experiment['service_distributions'][:num_queues]]
+                                for experiment in experiments])
+    num_servers = np.array([experiment.get('num_servers') or [1] * num_queues for experiment in experiments])
+    return qna_tandem(arrival_moments[:, 0], arrival_moments[:, 1], service_moments[:, :, 0], service_moments[:, :, 1], num_servers)
+
+#the vectorized approximation itself: arrival mean/scv of shape (G,), service means/scvs and server counts of shape (G, K)
+def qna_tandem(arrival_means, arrival_scvs, service_means, service_scvs, num_servers=None):
+    service_means = np.asarray(service_means, dtype=np.float64)
+    service_scvs = np.asarray(service_scvs, dtype=np.float64)
+    num_servers = np.ones_like(service_means) if num_servers is None else np.asarray(num_servers, dtype=np.float64)
+    arrival_rates = 1 / np.asarray(arrival_means, dtype=np.float64)
+    scvs = np.asarray(arrival_scvs, dtype=np.float64)
+
+    utilization = arrival_rates[:, None] * service_means / num_servers
+    wait_times = np.empty_like(service_means)
+    arrival_scvs = np.empty_like(service_means)
+    for i in range(service_means.shape[1]):
+        rho = utilization[:, i]
+        arrival_scvs[:, i] = scvs
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mmc_wait = erlang_c(num_servers[:, i], arrival_rates * service_means[:, i]) * service_means[:, i] / (num_servers[:, i] * (1 - rho))
+        wait_times[:, i] = np.where(rho < 1, (scvs + service_scvs[:, i]) / 2 * mmc_wait, np.inf)
+        scvs = 1 + (1 - rho**2) * (scvs - 1) + rho**2 * (service_scvs[:, i] - 1) / np.sqrt(num_servers[:, i])
+
+    sojourn_times = wait_times + service_means
+    mean_jobcounts = arrival_rates[:, None] * sojourn_times
+    return {
+        'utilization': utilization,
+        'wait_times': wait_times,
+        'mean_soujorntime_perqueue': sojourn_times,
+        'mean_jobcounts': mean_jobcounts,
+        'arrival_scvs': arrival_scvs,
+        'throughput': arrival_rates,
+        'overall_mean_jobcount': mean_jobcounts.sum(axis=1),
+        'overall_mean_soujorntime': sojourn_times.sum(axis=1),
+    }
+
+#indices of the experiments worth simulating: the stable ones (max utilization < max_utilization) with the
+#smallest metric, at most top of them and only those with metric <= max_value if given. pass them on to sweep.sweep
+def shortlist(experiments, metric='overall_mean_soujorntime', top=None, max_value=None, max_utilization=1.0):
+    values = screen(experiments)
+    candidates = np.flatnonzero(values['utilization'].max(axis=1) < max_utilization)
+    if max_value is not None:
+        candidates = candidates[values[metric][candidates] <= max_value]
+    candidates = candidates[np.argsort(values[metric][candidates], kind='stable')]
+    if top is not None:
+        candidates = candidates[:top]
+    return candidates.tolist()
@@ -0,0 +1,244 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+#benchmark suite for the simulator engines.
+#  python benchmark.py run --output baseline.json [--quick]    sweep and store the results as a JSON baseline
+#  python benchmark.py compare baseline.json current.json      report regressions (exit status 1 if there are any)
+#  python benchmark.py importtime [--budget 0.5]                 check the import time budget of the simulator modules
+#  python benchmark.py workers                                  check that replication results do not depend on max_workers
+#every configuration runs in a fresh interpreter, so its peak RSS and startup time are its own
+
+FULL_GRID = {
+    'num_jobs': [10**4, 10**5, 10**6, 10**7],
+    'num_queues': [1, 2, 4],
+    'utilization': [0.5, 0.8, 0.9, 0.99],
+    'distribution': ['exponential', 'erlang', 'hyperexponential', 'hypoexponential', 'uniform'],
+    'engine': ['event', 'recursion'],
+}
+
+QUICK_GRID = {
+    'num_jobs': [10**4, 10**5],
+    'num_queues': [2],
+    'utilization': [0.5, 0.9],
+    'distribution': ['exponential', 'erlang'],
+    'engine': ['event', 'recursion'],
+}
+
+#engine -> (run_simulation mode, TandemQueueSimulator options)
+ENGINES = {
+    'event': ('event', {}),
+    'event-linkedlist': ('event', {'event_stack_type': 'linkedlist'}),
+    'event-streaming': ('event', {'streaming_stats': True, 'chunk_size': 65536}),
+    'recursion': ('recursion', {}),
+}
+
+ARRIVAL_RATE = 1.0
+
+#importing these must stay side-effect free and cheap: within the budget (seconds, fresh interpreter)
+#and without pulling in the heavy plotting/statistics/compiler packages
+IMPORT_TIME_BUDGET = 0.5
+IMPORT_MODULES = ['tandemqueuesimulator2', 'networksimulator', 'multiclasssimulator', 'replication', 'estimation', 'simulationplot',
+                  'instrumentation', 'timeseries', 'traces', 'sweep', 'analytic', 'main2']
+HEAVY_MODULES = ['matplotlib', 'scipy', 'numba']
+
+
+#service time distribution dict of a family with the given mean
+def service_distribution(family, mean):
+    if family in ('exponential', 'uniform'):
+        return {'type': 'exponential', 'params': {'rate': 1 / mean}}
+    elif family == 'erlang':
+        return {'type': 'erlang', 'params': {'rate': 2 / mean, 'k': 2}}
+    elif family == 'hyperexponential':
+        return {'type': 'hyperexponential', 'params': {'rates': [1 / (0.25 * mean), 1 / (1.75 * mean)], 'probs': [0.5, 0.5]}}
+    elif family == 'hypoexponential':
+        return {'type': 'hypoexponential', 'params': {'rates': [1 / (0.4 * mean), 1 / (0.6 * mean)]}}
+    raise ValueError(f"Unsupported distribution type: {family}")
+
+#the 'uniform' family has U(0,1) inter-arrival times (rate 2), the others poisson arrivals
+def arrival_distribution(family):
+    if family == 'uniform':
+        return {'type': 'uniform', 'params': {}}
+    return {'type': 'exponential', 'params': {'rate': ARRIVAL_RATE}}
+
+def config_key(config):
+    return f"{config['engine']}/{config['distribution']}/jobs={config['num_jobs']}/queues={config['num_queues']}/rho={config['utilization']}"
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+#runs one configuration in this process and returns its measurements
+def run_single(config):
+    start = time.perf_counter()
+    import numpy as np
+    from tandemqueuesimulator2 import TandemQueueSimulator
+    import_time = time.perf_counter() - start
+
+    mode, options = ENGINES[config['engine']]
+    arrival = arrival_distribution(config['distribution'])
+    arrival_rate = 2.0 if config['distribution'] == 'uniform' else ARRIVAL_RATE
+    services = [service_distribution(config['distribution'], config['utilization'] / arrival_rate)] * config['num_queues']
+
+    start = time.perf_counter()
+    sim = TandemQueueSimulator([arrival], services, config['num_jobs'], False, config['num_queues'],
+                               rng=np.random.default_rng(config['seed']), **options)
+    setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sim.run_simulation(mode=mode)
+    sim.calculate_statistics()
+    run_time = time.perf_counter() - start
+
+    #an arrival and a departure per job and queue
+    events = 2 * config['num_jobs'] * config['num_queues']
+    return dict(config, key=config_key(config), import_time=import_time, setup_time=setup_time, startup_time=import_time + setup_time,
+                run_time=run_time, events=events, events_per_second=events / run_time, peak_rss_mb=peak_rss_mb(),
+                mean_sojourn_time=float(sim.overall_mean_soujorntime))
+
+def run_isolated(config):
+    output = subprocess.run([sys.executable, __file__, '_single', json.dumps(config)], capture_output=True, text=True, check=True).stdout
+    #the simulator prints progress, the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+#best of repeat import times of module in fresh interpreters, and the heavy modules the import loaded
+def measure_import_time(module, repeat=5):
+    code = (f"import json, sys, time; start = time.perf_counter(); import {module}; elapsed = time.perf_counter() - start; "
+            f"print(json.dumps([elapsed, [name for name in {HEAVY_MODULES!r} if name in sys.modules]]))")
+    best = None
+    for _ in range(repeat):
+        #run next to the modules, wherever benchmark.py is called from
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        elapsed, heavy = json.loads(output.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best, heavy
+
+def check_import_budget(budget=IMPORT_TIME_BUDGET, repeat=5):
+    failures = []
+    for module in IMPORT_MODULES:
+        elapsed, heavy = measure_import_time(module, repeat)
+        ok = elapsed <= budget and not heavy
+        print(f"import {module}: {elapsed:.3f}s (budget {budget}s){', loads ' + ', '.join(heavy) if heavy else ''} {'ok' if ok else 'OVER BUDGET'}")
+        if not ok:
+            failures.append((module, elapsed, heavy))
+    return failures
+
+#run_experiments in this process and in a process pool with common random numbers and antithetic pairs, per engine
+#(replication by replication and batch): the results must be identical. returns the variants that differ
+def check_worker_independence(num_jobs=2000, num_replications=3, seed=1, max_workers=2):
+    import replication
+    arrival = arrival_distribution('exponential')
+    experiments = [{'arrival_distributions': [arrival], 'service_distributions': [service_distribution(family, 0.8 / ARRIVAL_RATE)] * 2,
+                    'num_jobs': num_jobs, 'jackson': False, 'num_queues': 2} for family in ('exponential', 'erlang')]
+    failures = []
+    for batch, common_random_numbers, antithetic in itertools.product([False, True], repeat=3):
+        variant = dict(batch=batch, common_random_numbers=common_random_numbers, antithetic=antithetic)
+        serial = replication.run_experiments(experiments, num_replications, seed, 1, **variant)
+        pooled = replication.run_experiments(experiments, num_replications, seed, max_workers, **variant)
+        ok = serial == pooled
+        print(f"workers {variant}: {'ok' if ok else 'DIFFERENT RESULTS'}")
+        if not ok:
+            failures.append(variant)
+    return failures
+
+def run_suite(grid, seed=1, output=None):
+    keys = ['engine', 'distribution', 'num_jobs', 'num_queues', 'utilization']
+    results = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        config = dict(zip(keys, values), seed=seed)
+        result = run_isolated(config)
+        print(f"{result['key']}: {result['events_per_second']:.0f} events/s, peak RSS {result['peak_rss_mb']:.1f} MB, "
+              f"startup {result['startup_time']:.3f}s")
+        results.append(result)
+
+    baseline = {'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+                'results': results}
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(baseline, f, indent=2)
+    return baseline
+
+#regressions of current against baseline: throughput lower, or peak RSS / startup time higher, by more than tolerance
+def compare(baseline, current, tolerance=0.2):
+    baseline_results = {result['key']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        reference = baseline_results.get(result['key'])
+        if reference is None:
+            continue
+        checks = [('events_per_second', result['events_per_second'] < reference['events_per_second'] * (1 - tolerance)),
+                  ('peak_rss_mb', result['peak_rss_mb'] > reference['peak_rss_mb'] * (1 + tolerance)),
+                  ('startup_time', result['startup_time'] > reference['startup_time'] * (1 + tolerance))]
+        for metric, regressed in checks:
+            status = 'REGRESSION' if regressed else 'ok'
+            print(f"{result['key']} {metric}: {reference[metric]:.4g} -> {result[metric]:.4g} {status}")
+            if regressed:
+                regressions.append((result['key'], metric, reference[metric], result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulator benchmark suite")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="run the sweep and write a JSON baseline")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--quick', action='store_true', help="small grid for a fast check")
+    run_parser.add_argument('--seed', type=int, default=1)
+    for key in ['num_jobs', 'num_queues']:
+        run_parser.add_argument('--' + key.replace('_', '-'), type=int, nargs='+')
+    run_parser.add_argument('--utilization', type=float, nargs='+')
+    run_parser.add_argument('--distribution', nargs='+')
+    run_parser.add_argument('--engine', nargs='+', choices=sorted(ENGINES))
+
+    compare_parser = subparsers.add_parser('compare', help="compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.2)
+
+    import_parser = subparsers.add_parser('importtime', help="check the import time budget")
+    import_parser.add_argument('--budget', type=float, default=IMPORT_TIME_BUDGET)
+    import_parser.add_argument('--repeat', type=int, default=5)
+
+    workers_parser = subparsers.add_parser('workers', help="check that the results do not depend on max_workers")
+    workers_parser.add_argument('--max-workers', type=int, default=2)
+
+    single_parser = subparsers.add_parser('_single')
+    single_parser.add_argument('config')
+
+    args = parser.parse_args(argv)
+    if args.command == '_single':
+        print(json.dumps(run_single(json.loads(args.config))))
+    elif args.command == 'run':
+        grid = dict(QUICK_GRID if args.quick else FULL_GRID)
+        for key in grid:
+            if getattr(args, key) is not None:
+                grid[key] = getattr(args, key)
+        run_suite(grid, args.seed, args.output)
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        print(f"{len(regressions)} regression(s)")
+        return 1 if regressions else 0
+    elif args.command == 'importtime':
+        return 1 if check_import_budget(args.budget, args.repeat) else 0
+    elif args.command == 'workers':
+        return 1 if check_worker_independence(max_workers=args.max_workers) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
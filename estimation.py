@@ -0,0 +1,68 @@
+import numpy as np
+import simulationplot
+
+
+#MSER truncation point: the number of leading batch means to delete so that the standard error
+#of the mean of the remaining ones is minimal. on 5-observation batch means this is MSER-5.
+#only the first max_fraction of the run is considered, a minimum later than that means the run is too short
+def mser(batch_means, max_fraction=0.5):
+    x = np.asarray(batch_means, dtype=np.float64)
+    n = len(x)
+    if n == 0:
+        return 0
+    counts = n - np.arange(n)
+    suffix_sums = np.cumsum(x[::-1])[::-1]
+    suffix_means = suffix_sums / counts
+    #sum of squared deviations of x[d:] from its mean, for every d
+    squared_deviations = np.cumsum(((x - suffix_means[0]) ** 2)[::-1])[::-1] - counts * (suffix_means - suffix_means[0]) ** 2
+    statistic = squared_deviations / counts ** 2
+    return int(np.argmin(statistic[:int(n * max_fraction) + 1]))
+
+#mean and CI half-width from num_batches equal batches of the observations, via simulationplot.compute_ci
+def batch_means_ci(observations, num_batches=20, confidence=0.95):
+    x = np.asarray(observations, dtype=np.float64)
+    batch_size = len(x) // num_batches
+    if batch_size == 0:
+        return np.mean(x) if len(x) else np.nan, np.inf
+    #the leftover observations are dropped from the start, next to the deleted warm-up
+    x = x[len(x) - batch_size * num_batches:]
+    return simulationplot.compute_ci(x.reshape(num_batches, batch_size).mean(axis=1), confidence)
+
+#(mean, error) of the time averages over num_batches equal batches of the 5-job batches from warmup on, in the
+#replication.summarize layout. counters[k] are the cumulative [time, time weighted job count of every queue,
+#service time of every queue] after 5-job batch k: a batch's throughput is its jobs / its duration, its mean job
+#count and utilization the increase of the area / service time over its duration
+def time_average_cis(counters, warmup, num_servers, num_batches=20, confidence=0.95):
+    num_queues = len(num_servers)
+    #the counters are all zero at the start of the run
+    counters = np.vstack((np.zeros((1, 1 + 2 * num_queues)), np.asarray(counters, dtype=np.float64).reshape(-1, 1 + 2 * num_queues)))
+    batch_size = (len(counters) - 1 - warmup) // num_batches
+    if batch_size == 0:
+        no_ci = (np.nan, np.inf)
+        return {'overall_mean_jobcount': no_ci, 'throughput': no_ci,
+                'queue_utilizations': [no_ci] * num_queues, 'mean_jobcounts': [no_ci] * num_queues}
+    #like batch_means_ci the leftover 5-job batches are dropped from the start
+    boundaries = len(counters) - 1 - batch_size * num_batches + batch_size * np.arange(num_batches + 1)
+    increases = np.diff(counters[boundaries], axis=0)
+    durations = increases[:, 0]
+    jobcounts = increases[:, 1:1 + num_queues] / durations[:, None]
+    utilizations = increases[:, 1 + num_queues:] / (durations[:, None] * np.asarray(num_servers))
+    return {
+        'overall_mean_jobcount': simulationplot.compute_ci(jobcounts.sum(axis=1), confidence),
+        'throughput': simulationplot.compute_ci(5 * batch_size / durations, confidence),
+        'queue_utilizations': [simulationplot.compute_ci(utilizations[:, i], confidence) for i in range(num_queues)],
+        'mean_jobcounts': [simulationplot.compute_ci(jobcounts[:, i], confidence) for i in range(num_queues)],
+    }
+
+#single run estimate from the 5-observation batch means of a simulation (BatchRecorder(5).batch_means):
+#MSER-5 warm-up deletion followed by batch means
+#MSER-5 warm-up deletion followed by batch means.
+#with the counters of the same batches (see time_average_cis) 'cis' holds the CIs of every metric of
+#replication.summarize, the sojourn time in the system included, with the same warm-up deleted
+def estimate(five_batch_means, num_batches=20, confidence=0.95, counters=None, num_servers=None):
+    warmup = mser(five_batch_means)
+    mean, error = batch_means_ci(five_batch_means[warmup:], num_batches, confidence)
+    result = {'mean': mean, 'error': error, 'warmup_observations': 5 * warmup, 'observations': 5 * len(five_batch_means)}
+    if counters is not None:
+        result['cis'] = dict(time_average_cis(counters, warmup, num_servers, num_batches, confidence), overall_mean_soujorntime=(mean, error))
+    return result
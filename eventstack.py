@@ -1,10 +1,9 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from collections import deque
-from scipy.stats import t
-import os,sys
+import heapq
 
 class Job:
+    __slots__ = ('job_id', 'queueids', 'arrival_times', 'depurture_times', 'service_times', 'wait_times', 'sojourn_times', 'overall_sojourntime')
+
     def __init__(self, job_id):
         self.job_id = job_id
         #we can put various properties of a job (that may be useful for statistical purpose)
@@ -33,14 +32,83 @@ class Job:
         print(f"departure: {self.depurture_times}")
         print(f"sojourn: {self.sojourn_times}")
         print(f"total sojourn: {self.overall_sojourntime}")
+
+
+#columnar per job records: preallocated (num_jobs, num_queues) arrays instead of one Job with lists per job.
+#column i holds the times of the job in queue i, nan until the job gets there
+class JobStore:
+    def __init__(self, num_jobs, num_queues):
+        self.num_jobs = num_jobs
+        self.num_queues = num_queues
+        self.arrival_times = np.full((num_jobs, num_queues), np.nan)
+        self.service_times = np.full((num_jobs, num_queues), np.nan)
+        self.depurture_times = np.full((num_jobs, num_queues), np.nan)
+        self.wait_times = None
+        self.sojourn_times = None
+        self.overall_sojourntimes = None
+
+    #vectorized Job.calulate_jobstats over all jobs
+    def calulate_jobstats(self):
+        self.wait_times = np.maximum(0, self.depurture_times - self.service_times - self.arrival_times)
+        self.sojourn_times = self.depurture_times - self.arrival_times
+        #summed queue by queue like Job.overall_sojourntime
+        self.overall_sojourntimes = np.zeros(self.num_jobs)
+        for i in range(self.num_queues):
+            self.overall_sojourntimes += self.sojourn_times[:, i]
+
+    #Job view of one record, e.g. for print_jobstats
+    def get_job(self, job_id):
+        job = Job(job_id)
+        for i in range(self.num_queues):
+            if np.isnan(self.arrival_times[job_id, i]):
+                continue
+            job.queueids.append(i)
+            job.arrival_times.append(self.arrival_times[job_id, i])
+            job.service_times.append(self.service_times[job_id, i])
+            job.depurture_times.append(self.depurture_times[job_id, i])
+        job.calulate_jobstats()
+        return job
+
+    #arrival, service and departure times stacked into one (3, num_jobs, num_queues) .npy file
+    def to_npy(self, path):
+        np.save(path, np.stack([self.arrival_times, self.service_times, self.depurture_times]))
+
+    #mmap_mode='r' maps the file instead of loading it
+    @classmethod
+    def from_npy(cls, path, mmap_mode=None):
+        records = np.load(path, mmap_mode=mmap_mode)
+        store = cls.__new__(cls)
+        store.num_jobs, store.num_queues = records.shape[1], records.shape[2]
+        store.arrival_times, store.service_times, store.depurture_times = records[0], records[1], records[2]
+        store.wait_times = store.sojourn_times = store.overall_sojourntimes = None
+        return store
+
+    #one row per job with arrival_q<i>, service_q<i>, depurture_q<i> columns, needs pyarrow
+    def to_parquet(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required to export the job store to Parquet")
+
+        columns = {'job_id': np.arange(self.num_jobs)}
+        for i in range(self.num_queues):
+            columns[f'arrival_q{i}'] = self.arrival_times[:, i]
+            columns[f'service_q{i}'] = self.service_times[:, i]
+            columns[f'depurture_q{i}'] = self.depurture_times[:, i]
+        pq.write_table(pa.table(columns), path)
         
 
 class EventType:
+    __slots__ = ('queueid', 'type')
+
     def __init__(self, event_type, queueid):
         self.queueid = queueid
         self.type = event_type  # 'arrival', 'departure'
         
 class Event:
+    __slots__ = ('event_time', 'event_type', 'job_id', 'next', 'prev')
+
     def __init__(self, time, event_type, job_id):
         self.event_time = time
         self.event_type = event_type  # 'arrival_q1', 'departure_q1', 'departure_q2'
@@ -83,4 +151,41 @@ class EventStack:
             self.head.prev = None
         return event
 
+    #pending events in pop order, without removing them
+    def pending_events(self):
+        events = []
+        current = self.head
+        while current:
+            events.append(current)
+            current = current.next
+        return events
+
+
+class HeapEventStack:
+    # binary heap event set, O(log n) insert/pop.
+    # entries are (time, seq, event); seq is an insertion counter so events with equal time
+    # come out in FIFO order, exactly like the linked list EventStack (which inserts after equal times)
+    def __init__(self):
+        self.heap = []
+        self.seq = 0
+
+    def insert_event(self, event):
+        heapq.heappush(self.heap, (event.event_time, self.seq, event))
+        self.seq += 1
+
+    def pop_event(self):
+        if not self.heap:
+            return None
+        return heapq.heappop(self.heap)[2]
+
+    #pending events in pop order, without removing them
+    def pending_events(self):
+        return [entry[2] for entry in sorted(self.heap, key=lambda entry: (entry[0], entry[1]))]
+
+
+EVENT_STACKS = {'linkedlist': EventStack, 'heap': HeapEventStack}
 
+def make_event_stack(kind='heap'):
+    if kind not in EVENT_STACKS:
+        raise ValueError(f"Unsupported event stack type: {kind}")
+    return EVENT_STACKS[kind]()
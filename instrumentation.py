@@ -0,0 +1,116 @@
+import json
+import time
+
+
+#event stack wrapper timing insert_event/pop_event and tracking the number of pending events.
+#only installed while a profiled run is going on, an unprofiled run uses the bare event stack
+class TimedEventStack:
+    def __init__(self, event_stack):
+        self.event_stack = event_stack
+        self.insert_calls = 0
+        self.insert_time = 0.0
+        self.pop_calls = 0
+        self.pop_time = 0.0
+        self.size = 0
+        self.peak_size = 0
+
+    def insert_event(self, event):
+        start = time.perf_counter()
+        self.event_stack.insert_event(event)
+        self.insert_time += time.perf_counter() - start
+        self.insert_calls += 1
+        self.size += 1
+        if self.size > self.peak_size:
+            self.peak_size = self.size
+
+    def pop_event(self):
+        start = time.perf_counter()
+        event = self.event_stack.pop_event()
+        self.pop_time += time.perf_counter() - start
+        self.pop_calls += 1
+        if event is not None:
+            self.size -= 1
+        return event
+
+
+#opt-in profile of the event loop: run_simulation(profiler=SimulationProfiler()).
+#reports events/second, processing time per event type and queue, insert_event vs pop_event time
+#and the event set size over time (every sample_every events, at most max_samples points)
+class SimulationProfiler:
+    def __init__(self, sample_every=1000, max_samples=10000):
+        self.sample_every = sample_every
+        self.max_samples = max_samples
+        self.events = 0
+        self.wall_time = 0.0
+        self.simulated_time = 0.0
+        self.event_counts = {}
+        self.event_times = {}
+        self.size_samples = []
+        self.event_stack_type = None
+        self.timed_stack = None
+
+    #the profiled version of TandemQueueSimulator.run_events
+    def run(self, sim, first_queueid=0, jobs_done=None):
+        if jobs_done is None:
+            jobs_done = sim.num_jobs
+        self.event_stack_type = type(sim.event_stack).__name__
+        self.timed_stack = TimedEventStack(sim.event_stack)
+        sim.event_stack = self.timed_stack
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        try:
+            sim.schedule_first_arrivals(first_queueid)
+            while sim.jobsdone < jobs_done:
+                event = sim.event_stack.pop_event()
+                if event:
+                    sim.current_time = event.event_time
+                    time_spent = sim.current_time - sim.prev_event_time
+                    sim.prev_event_time = sim.current_time
+                    event_start = perf_counter()
+                    sim.process_event(event, time_spent)
+                    self.add_event(f"{event.event_type.type}_q{event.event_type.queueid}", perf_counter() - event_start, sim.current_time)
+        finally:
+            self.wall_time += perf_counter() - start
+            self.simulated_time = sim.current_time
+            sim.event_stack = self.timed_stack.event_stack
+
+    def add_event(self, key, duration, current_time):
+        self.events += 1
+        self.event_counts[key] = self.event_counts.get(key, 0) + 1
+        self.event_times[key] = self.event_times.get(key, 0.0) + duration
+        if self.events % self.sample_every == 0:
+            self.size_samples.append((self.events, current_time, self.timed_stack.size))
+            #keep memory bounded: halve the resolution when the samples are full
+            if len(self.size_samples) >= self.max_samples:
+                self.size_samples = self.size_samples[1::2]
+                self.sample_every *= 2
+
+    def report(self):
+        stack = self.timed_stack
+        return {
+            'events': self.events,
+            'wall_time': self.wall_time,
+            'events_per_second': self.events / self.wall_time if self.wall_time > 0 else None,
+            'simulated_time': float(self.simulated_time),
+            #includes the insert_event calls made while processing the events
+            'process_event_time': sum(self.event_times.values()),
+            'event_types': {key: {'count': count, 'total_time': self.event_times[key], 'mean_time': self.event_times[key] / count}
+                            for key, count in self.event_counts.items()},
+            'event_stack': {
+                'type': self.event_stack_type,
+                'insert_calls': stack.insert_calls if stack else 0,
+                'insert_time': stack.insert_time if stack else 0.0,
+                'pop_calls': stack.pop_calls if stack else 0,
+                'pop_time': stack.pop_time if stack else 0.0,
+                'peak_size': stack.peak_size if stack else 0,
+            },
+            #[events processed, simulated time, pending events]
+            'event_set_size': [[events, float(current_time), size] for events, current_time, size in self.size_samples],
+        }
+
+    def to_json(self, path=None):
+        report = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(report)
+        return report
@@ -0,0 +1,181 @@
+import heapq
+import traces
+from eventstack import Event, EventType
+from streamstats import RunningStats
+from tandemqueuesimulator2 import TandemQueueSimulator, VariateStream, spawn_rngs
+
+#station disciplines. class 0 has the highest priority
+#  fifo:       order of arrival at the station, whatever the class
+#  priority:   non-preemptive priority, FIFO within a class
+#  preemptive: preemptive-resume priority, an arriving job interrupts the service of a lower priority job
+#  sjf:        non-preemptive shortest job first (by the service time at this station)
+DISCIPLINES = ('fifo', 'priority', 'preemptive', 'sjf')
+
+
+#tandem line of single server stations shared by several job classes, each with its own external arrival stream
+#(into station 0) and its own service distribution at every station.
+#class_service_distributions[c][i]: service time distribution of class c at station i.
+#the waiting jobs of every station are kept in one heap per class, keyed by arrival order (sjf: by service time),
+#so choosing the next job costs O(log n) (plus a look at the num_classes heap heads). statistics are always streaming
+class MultiClassSimulator(TandemQueueSimulator):
+    def __init__(self, class_arrival_distributions, class_service_distributions, num_jobs, num_queues=2, disciplines='priority',
+                 event_stack_type='heap', rng=None, quantiles=(), chunk_size=65536):
+        self.num_classes = len(class_arrival_distributions)
+        if len(class_service_distributions) != self.num_classes or any(len(services) != num_queues for services in class_service_distributions):
+            raise ValueError("class_service_distributions needs num_queues service distributions per class")
+        self.disciplines = [disciplines] * num_queues if isinstance(disciplines, str) else list(disciplines)
+        if len(self.disciplines) != num_queues or any(discipline not in DISCIPLINES for discipline in self.disciplines):
+            raise ValueError(f"disciplines must be one of {DISCIPLINES} or a list of those, one per station")
+        #sjf reorders the jobs of a class, their trace rows would no longer pair up across stations
+        if 'sjf' in self.disciplines and any(traces.is_trace(distribution) for services in class_service_distributions for distribution in services):
+            raise ValueError("trace service times cannot be used with sjf stations")
+        self.class_types = [EventType('external', c) for c in range(self.num_classes)]
+
+        super().__init__(class_arrival_distributions, class_service_distributions, num_jobs, False, num_queues, event_stack_type=event_stack_type,
+                         rng=rng, streaming_stats=True, quantiles=quantiles, chunk_size=chunk_size)
+
+        #per station: one heap of waiting jobs per class, the job in service and the time its service ends
+        self.waiting = [[[] for _ in range(self.num_classes)] for _ in range(self.num_queues)]
+        self.in_service = [None] * self.num_queues
+        self.service_ends = [0] * self.num_queues
+        self.arrival_counter = 0
+
+        self.class_sojourn_stats = [RunningStats(quantiles) for _ in range(self.num_classes)]
+        self.class_wait_stats = [RunningStats() for _ in range(self.num_classes)]
+        #[class][station]
+        self.class_station_wait_stats = [[RunningStats() for _ in range(self.num_queues)] for _ in range(self.num_classes)]
+        self.class_mean_soujorntimes = [0] * self.num_classes
+        self.class_mean_waittimes = [0] * self.num_classes
+        self.class_throughputs = [0] * self.num_classes
+
+    def create_streams(self, arrival_distributions, service_distributions, rng, chunk_size):
+        stream_rngs = spawn_rngs(rng, self.num_classes * (1 + self.num_queues))
+        self.inter_arrivaltimes = None
+        self.servicetimes = None
+        self.class_arrival_streams = [VariateStream(arrival_distributions[c], stream_rngs[c], chunk_size, self.antithetic) for c in range(self.num_classes)]
+        #[class][station]
+        self.class_service_streams = [[VariateStream(service_distributions[c][i], stream_rngs[self.num_classes + c * self.num_queues + i], chunk_size, self.antithetic)
+                                       for i in range(self.num_queues)] for c in range(self.num_classes)]
+
+    def run_recursion(self):
+        raise ValueError("the recursion engine only supports single class FIFO lines")
+
+    def schedule_first_arrivals(self, first_queueid=0):
+        for c, stream in enumerate(self.class_arrival_streams):
+            self.event_stack.insert_event(Event(stream.next(), self.class_types[c], None))
+
+    def process_event(self, event, time_spent):
+        if self.timeseries is not None:
+            self.timeseries.advance(self.current_time, self.queue_lengths)
+        for i in range(self.num_queues):
+            self.time_weighted_job_counts_in_queues[i] += time_spent * self.queue_lengths[i]
+
+        event_type = event.event_type.type
+        if event_type == 'external':
+            job_class = event.event_type.queueid
+            if self.next_job_id >= self.num_jobs:
+                return
+            job_id = self.next_job_id
+            self.next_job_id += 1
+            #[class, arrival at the station, remaining service, arrival in the system, total service, arrival order at the station, service at the station]
+            self.pending_jobs[job_id] = [job_class, 0, 0, self.current_time, 0, 0, 0]
+            next_arrival = self.class_arrival_streams[job_class].next()
+            self.event_stack.insert_event(Event(self.current_time + next_arrival, self.class_types[job_class], None))
+            self.arrive(job_id, 0)
+
+        elif event_type == 'departure':
+            queueid = event.event_type.queueid
+            #the departure of a preempted service is stale, the job left the server before it
+            if self.in_service[queueid] != event.job_id or self.service_ends[queueid] != event.event_time:
+                return
+            self.depart(event.job_id, queueid)
+
+    def arrive(self, job_id, queueid):
+        job = self.pending_jobs[job_id]
+        service_time = self.class_service_streams[job[0]][queueid].next()
+        job[1] = self.current_time
+        job[2] = service_time
+        job[4] += service_time
+        job[5] = self.arrival_counter
+        job[6] = service_time
+        self.arrival_counter += 1
+        self.queue_lengths[queueid] += 1
+        self.queue_utilizations[queueid] += service_time
+
+        current = self.in_service[queueid]
+        if current is None:
+            self.start_service(job_id, queueid)
+        elif self.disciplines[queueid] == 'preemptive' and job[0] < self.pending_jobs[current][0]:
+            #the interrupted job resumes later with what is left of its service
+            self.pending_jobs[current][2] = self.service_ends[queueid] - self.current_time
+            self.add_waiting(current, queueid)
+            self.start_service(job_id, queueid)
+        else:
+            self.add_waiting(job_id, queueid)
+
+    def add_waiting(self, job_id, queueid):
+        job = self.pending_jobs[job_id]
+        if self.disciplines[queueid] == 'sjf':
+            heapq.heappush(self.waiting[queueid][job[0]], (job[2], job[5], job_id))
+        else:
+            heapq.heappush(self.waiting[queueid][job[0]], (job[5], job_id))
+
+    def next_waiting(self, queueid):
+        heaps = self.waiting[queueid]
+        if self.disciplines[queueid] in ('priority', 'preemptive'):
+            for heap in heaps:
+                if heap:
+                    return heapq.heappop(heap)[-1]
+            return None
+        #fifo / sjf: the smallest key over the class heap heads
+        best = None
+        for heap in heaps:
+            if heap and (best is None or heap[0] < best[0]):
+                best = heap
+        return heapq.heappop(best)[-1] if best is not None else None
+
+    def start_service(self, job_id, queueid):
+        self.in_service[queueid] = job_id
+        self.service_ends[queueid] = self.current_time + self.pending_jobs[job_id][2]
+        self.event_stack.insert_event(Event(self.service_ends[queueid], self.departure_types[queueid], job_id))
+
+    def depart(self, job_id, queueid):
+        job = self.pending_jobs[job_id]
+        job_class = job[0]
+        self.queue_lengths[queueid] -= 1
+        self.in_service[queueid] = None
+
+        sojourn_time = self.current_time - job[1]
+        self.sojourn_stats[queueid].add(sojourn_time)
+        self.wait_stats[queueid].add(sojourn_time - job[6])
+        self.class_station_wait_stats[job_class][queueid].add(sojourn_time - job[6])
+
+        if queueid == self.num_queues - 1:
+            system_sojourn_time = self.current_time - job[3]
+            self.system_sojourn_stats.add(system_sojourn_time)
+            self.class_sojourn_stats[job_class].add(system_sojourn_time)
+            self.class_wait_stats[job_class].add(system_sojourn_time - job[4])
+            del self.pending_jobs[job_id]
+            self.jobsdone += 1
+        else:
+            self.arrive(job_id, queueid + 1)
+
+        next_job = self.next_waiting(queueid)
+        if next_job is not None:
+            self.start_service(next_job, queueid)
+
+    def calculate_statistics(self):
+        super().calculate_statistics()
+        for c in range(self.num_classes):
+            self.class_mean_soujorntimes[c] = self.class_sojourn_stats[c].mean()
+            self.class_mean_waittimes[c] = self.class_wait_stats[c].mean()
+            self.class_throughputs[c] = self.class_sojourn_stats[c].count / self.current_time
+
+    def print_stats(self):
+        super().print_stats()
+        for c in range(self.num_classes):
+            print("simulation results: class", c)
+            print(f'Throughput: {self.class_throughputs[c]}')
+            print(f'Mean sojourn time in system: {self.class_mean_soujorntimes[c]}')
+            print(f'Mean wait time in system: {self.class_mean_waittimes[c]}')
+            print(f'Mean wait time per queue: {[stats.mean() for stats in self.class_station_wait_stats[c]]}')
@@ -0,0 +1,157 @@
+import numpy as np
+import traces
+from eventstack import Event, EventType
+from tandemqueuesimulator2 import TandemQueueSimulator, VariateStream, spawn_rngs
+
+UNIFORM = {'type': 'uniform', 'params': {}}
+
+
+#alias method (Vose): samples an outcome of a discrete distribution in O(1) from one uniform
+class AliasTable:
+    def __init__(self, probs):
+        probs = np.asarray(probs, dtype=np.float64)
+        self.size = len(probs)
+        scaled = probs * self.size / probs.sum()
+        self.prob = [1.0] * self.size
+        self.alias = list(range(self.size))
+
+        small = [i for i in range(self.size) if scaled[i] < 1.0]
+        large = [i for i in range(self.size) if scaled[i] >= 1.0]
+        while small and large:
+            i = small.pop()
+            j = large.pop()
+            self.prob[i] = scaled[i]
+            self.alias[i] = j
+            scaled[j] = (scaled[j] + scaled[i]) - 1.0
+            if scaled[j] < 1.0:
+                small.append(j)
+            else:
+                large.append(j)
+        #whatever is left is 1 up to rounding
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, uniform_sample):
+        scaled = uniform_sample * self.size
+        i = int(scaled)
+        if scaled - i < self.prob[i]:
+            return i
+        return self.alias[i]
+
+
+#open Jackson style network of FIFO queues (num_servers[i] parallel servers at queue i).
+#arrival_distributions[i]: external inter-arrival distribution of queue i, None if queue i has no external arrivals
+#routing_matrix[i][j]: probability that a job leaving queue i goes to queue j, with probability 1 - sum(routing_matrix[i]) it leaves the network.
+#jobs can visit queues any number of times (feedback), so the statistics are always streaming and the variates always chunked
+class NetworkQueueSimulator(TandemQueueSimulator):
+    def __init__(self, arrival_distributions, service_distributions, routing_matrix, num_jobs, jackson, event_stack_type='heap', rng=None, quantiles=(), chunk_size=65536, num_servers=None, antithetic=False):
+        num_queues = len(service_distributions)
+        routing_matrix = np.asarray(routing_matrix, dtype=np.float64)
+        if routing_matrix.shape != (num_queues, num_queues):
+            raise ValueError("routing_matrix must be num_queues x num_queues")
+        exit_probs = 1 - routing_matrix.sum(axis=1)
+        if (routing_matrix < 0).any() or (exit_probs < -1e-12).any():
+            raise ValueError("routing_matrix rows must be probabilities summing to at most 1")
+        if len(arrival_distributions) != num_queues:
+            raise ValueError("arrival_distributions needs one entry (or None) per queue")
+        if any(traces.is_trace(distribution) for distribution in service_distributions):
+            raise ValueError("trace service times are not supported in networks, routing does not keep the job order")
+        self.routing_matrix = routing_matrix
+
+        #one alias table per queue over the next queues plus 'leave' (= num_queues)
+        self.routing_tables = [AliasTable(np.append(routing_matrix[i], max(exit_probs[i], 0))) for i in range(num_queues)]
+        self.external_types = [EventType('external', i) for i in range(num_queues)]
+
+        super().__init__(arrival_distributions, service_distributions, num_jobs, jackson, num_queues, event_stack_type=event_stack_type,
+                         rng=rng, streaming_stats=True, quantiles=quantiles, chunk_size=chunk_size, num_servers=num_servers, antithetic=antithetic)
+        #time of the last length change of every queue. the time weighted lengths are only advanced
+        #for the queue an event touches, so an event costs O(1) instead of O(num_queues)
+        self.queue_change_times = [0] * num_queues
+
+    def create_streams(self, arrival_distributions, service_distributions, rng, chunk_size):
+        stream_rngs = spawn_rngs(rng, 2 * self.num_queues + 1)
+        self.inter_arrivaltimes = None
+        self.servicetimes = None
+        self.external_arrival_streams = [VariateStream(distribution, stream_rngs[i], chunk_size, self.antithetic) if distribution is not None else None
+                                         for i, distribution in enumerate(arrival_distributions)]
+        self.service_streams = [VariateStream(service_distributions[i], stream_rngs[self.num_queues + i], chunk_size, self.antithetic) for i in range(self.num_queues)]
+        self.routing_stream = VariateStream(UNIFORM, stream_rngs[-1], chunk_size, self.antithetic)
+
+    def external_arrival_rates(self):
+        return np.array(self.arrival_rates, dtype=np.float64)
+
+    def routing_probabilities(self):
+        return self.routing_matrix
+
+    def run_recursion(self):
+        raise ValueError("the recursion engine only supports tandem lines")
+
+    def schedule_first_arrivals(self, first_queueid=0):
+        for i, stream in enumerate(self.external_arrival_streams):
+            if stream is not None:
+                self.event_stack.insert_event(Event(stream.next(), self.external_types[i], None))
+
+    def process_event(self, event, time_spent):
+        event_queueid = event.event_type.queueid
+        event_type = event.event_type.type
+        if self.timeseries is not None:
+            self.timeseries.advance(self.current_time, self.queue_lengths)
+
+        #external arrival: the job is created here, and the next external arrival of this queue is scheduled
+        if event_type == 'external':
+            if self.next_job_id >= self.num_jobs:
+                return
+            job_id = self.next_job_id
+            self.next_job_id += 1
+            self.pending_jobs[job_id] = [self.current_time, 0, 0]
+            next_arrival = self.external_arrival_streams[event_queueid].next()
+            self.event_stack.insert_event(Event(self.current_time + next_arrival, self.external_types[event_queueid], None))
+            self.start_service(job_id, event_queueid)
+
+        elif event_type == 'arrival':
+            self.start_service(event.job_id, event_queueid)
+
+        elif event_type == 'departure':
+            self.advance_queue(event_queueid)
+            self.queue_lengths[event_queueid] -= 1
+            job = self.pending_jobs[event.job_id]
+            sojourn_time = self.current_time - job[0]
+            self.sojourn_stats[event_queueid].add(sojourn_time)
+            self.wait_stats[event_queueid].add(max(0, self.current_time - job[1] - job[0]))
+            job[2] += sojourn_time
+
+            next_queueid = self.routing_tables[event_queueid].sample(self.routing_stream.next())
+            if next_queueid == self.num_queues:
+                self.system_sojourn_stats.add(job[2])
+                if self.sojourn_batches is not None:
+                    self.record_sojourn_batch(job[2])
+                del self.pending_jobs[event.job_id]
+                self.jobsdone += 1
+            else:
+                job[0] = self.current_time
+                self.event_stack.insert_event(Event(self.current_time, self.arrival_types[next_queueid], event.job_id))
+
+    def advance_queue(self, queueid):
+        self.time_weighted_job_counts_in_queues[queueid] += (self.current_time - self.queue_change_times[queueid]) * self.queue_lengths[queueid]
+        self.queue_change_times[queueid] = self.current_time
+
+    #the job count areas are brought up to the current time first
+    def batch_counters(self):
+        for i in range(self.num_queues):
+            self.advance_queue(i)
+        return super().batch_counters()
+
+    def calculate_statistics(self):
+        for i in range(self.num_queues):
+            self.advance_queue(i)
+        super().calculate_statistics()
+
+    def start_service(self, job_id, queueid):
+        self.advance_queue(queueid)
+        self.queue_lengths[queueid] += 1
+        service_time = self.service_streams[queueid].next()
+        self.pending_jobs[job_id][1] = service_time
+        self.queue_utilizations[queueid] += service_time
+
+        depurture_time = self.service_departure_time(queueid, service_time)
+        self.event_stack.insert_event(Event(depurture_time, self.departure_types[queueid], job_id))
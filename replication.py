@@ -0,0 +1,210 @@
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from tandemqueuesimulator2 import TandemQueueSimulator, simulate_batch
+import simulationplot
+
+#statistics collected from every replication
+SYSTEM_METRICS = ['overall_mean_jobcount', 'overall_mean_soujorntime', 'throughput']
+QUEUE_METRICS = ['queue_utilizations', 'mean_jobcounts']
+#replications run_adaptive allocates between two re-estimations of the widths, fixed so the allocation does not depend on the machine
+ADAPTIVE_ROUND_SIZE = 8
+
+
+#one independent replication, seeded by its own SeedSequence instead of the global np.random
+#options are passed on to TandemQueueSimulator (e.g. streaming_stats=True)
+def run_replication(arrival_distributions, service_distributions, num_jobs, jackson, num_queues, seed_sequence, mode='event', **options):
+    sim = TandemQueueSimulator(arrival_distributions, service_distributions, num_jobs, jackson, num_queues, rng=np.random.default_rng(seed_sequence), **options)
+    sim.run_simulation(mode=mode)
+    sim.calculate_statistics()
+
+    result = {metric: float(getattr(sim, metric)) for metric in SYSTEM_METRICS}
+    for metric in QUEUE_METRICS:
+        result[metric] = [float(value) for value in getattr(sim, metric)]
+    return result
+
+def _run_replication(args):
+    experiment, seed_sequence = args
+    return run_replication(seed_sequence=seed_sequence, **experiment)
+
+#whether simulate_batch models the experiment: a FIFO single server tandem line without further simulator options
+def batch_supported(mode=None, **options):
+    num_servers = options.pop('num_servers', None)
+    if num_servers is not None and any(c > 1 for c in num_servers):
+        return False
+    return mode in (None, 'event', 'recursion') and not options
+
+#all replications of one experiment in a single vectorized simulate_batch call (FIFO single server tandem lines).
+#replication r draws the same variates as run_replication with seed_sequences[r]. experiments the lockstep
+#recursion cannot represent (multi server queues, other modes or options) run replication by replication instead
+def run_batch(arrival_distributions, service_distributions, num_jobs, jackson, num_queues, seed_sequences, mode=None, antithetic=False, **options):
+    if not batch_supported(mode, **options):
+        if mode is not None:
+            options['mode'] = mode
+        return [run_replication(arrival_distributions, service_distributions, num_jobs, jackson, num_queues, seed_sequence, antithetic=antithetic, **options)
+                for seed_sequence in seed_sequences]
+    batch_results = simulate_batch(len(seed_sequences), arrival_distributions, service_distributions, num_jobs, num_queues,
+                                   replication_rngs=[np.random.default_rng(seed_sequence) for seed_sequence in seed_sequences], antithetic=antithetic)
+    results = []
+    for r in range(len(seed_sequences)):
+        result = {metric: float(batch_results[metric][r]) for metric in SYSTEM_METRICS}
+        for metric in QUEUE_METRICS:
+            result[metric] = [float(value) for value in batch_results[metric][r]]
+        results.append(result)
+    return results
+
+def _run_batch(args):
+    experiment, seed_sequences = args
+    return run_batch(seed_sequences=seed_sequences, **experiment)
+
+
+#experiments: list of dicts with the run_replication arguments (arrival_distributions, service_distributions, num_jobs, jackson, num_queues[, mode, options])
+#every experiment gets a child of SeedSequence(seed) and every replication a child of that,
+#so the results are identical whatever max_workers is.
+#batch=True runs the replications of an experiment with run_batch, one task per experiment instead of per replication.
+#experiment_seeds (one SeedSequence per experiment) replaces the children of SeedSequence(seed).
+#variance reduction:
+#  common_random_numbers=True: replication r of every experiment gets the same seed, i.e. the same uniforms for the
+#  arrivals and for each queue's services, so differences between experiments (paired_difference) are far less noisy
+#  antithetic=True: a replication is an antithetic pair, the run on its seed plus the run on 1 - u, and its value the pair mean
+def run_experiments(experiments, num_replications, seed=None, max_workers=None, batch=False, experiment_seeds=None,
+                    common_random_numbers=False, antithetic=False):
+    if experiment_seeds is None:
+        if common_random_numbers:
+            replication_seeds = np.random.SeedSequence(seed).spawn(num_replications)
+        else:
+            experiment_seeds = np.random.SeedSequence(seed).spawn(len(experiments))
+    if experiment_seeds is not None:
+        replication_seeds = None
+
+    variants = [False, True] if antithetic else [False]
+    tasks = []
+    for i, experiment in enumerate(experiments):
+        seed_sequences = replication_seeds if replication_seeds is not None else experiment_seeds[i].spawn(num_replications)
+        for variant in variants:
+            variant_experiment = dict(experiment, antithetic=True) if variant else experiment
+            if batch:
+                tasks.append((variant_experiment, seed_sequences))
+            else:
+                for seed_sequence in seed_sequences:
+                    tasks.append((variant_experiment, seed_sequence))
+
+    run_task = _run_batch if batch else _run_replication
+    if max_workers == 1:
+        results = list(map(run_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(run_task, tasks))
+    if batch:
+        results = [result for batch_results in results for result in batch_results]
+
+    experiment_values = []
+    for i, experiment in enumerate(experiments):
+        runs = len(variants) * num_replications
+        experiment_results = results[i * runs:(i + 1) * runs]
+        if antithetic:
+            experiment_results = [average_results(plain, mirrored) for plain, mirrored in
+                                  zip(experiment_results[:num_replications], experiment_results[num_replications:])]
+        experiment_values.append(collect_results(experiment_results, experiment.get('num_queues', 2)))
+    return experiment_values
+
+def average_results(first, second):
+    result = {metric: (first[metric] + second[metric]) / 2 for metric in SYSTEM_METRICS}
+    for metric in QUEUE_METRICS:
+        result[metric] = [(a + b) / 2 for a, b in zip(first[metric], second[metric])]
+    return result
+
+#widest relative CI half-width (error / |mean|) over the given metrics, per queue metrics over all queues
+def relative_half_width(values, metrics, confidence=0.95):
+    widest = 0.0
+    for metric in metrics:
+        samples = [values[metric]] if metric in SYSTEM_METRICS else values[metric]
+        for sample in samples:
+            mean, error = simulationplot.compute_ci(sample, confidence)
+            widest = max(widest, error / abs(mean) if mean != 0 else math.inf)
+    return widest
+
+#the next num_replications replications, one at a time to the experiment whose relative half-width
+#is predicted widest (width * sqrt(n / (n + extra))), skipping experiments that already meet the target
+def allocate_replications(widths, counts, target, num_replications):
+    extra = [0] * len(widths)
+    predicted = list(widths)
+    for _ in range(num_replications):
+        i = max(range(len(widths)), key=lambda k: predicted[k])
+        if predicted[i] <= target:
+            break
+        extra[i] += 1
+        predicted[i] = widths[i] * math.sqrt(counts[i] / (counts[i] + extra[i]))
+    return {i: count for i, count in enumerate(extra) if count > 0}
+
+#adaptive number of replications per experiment: initial_replications each, then rounds of round_size replications
+#sent to the experiments with the widest relative half-width of metrics, until every experiment is within target or
+#budget replications (in total) are used.
+#returns the collect_results values and the final relative half-width of every experiment.
+#replication r of an experiment always gets the same seed and the allocation depends only on round_size (not on
+#max_workers), so the results are reproducible whatever max_workers is. a round_size of at least max_workers keeps the pool busy
+def run_adaptive(experiments, target=0.01, metrics=('overall_mean_soujorntime',), initial_replications=5, budget=None,
+                 round_size=ADAPTIVE_ROUND_SIZE, seed=None, max_workers=None, confidence=0.95):
+    if initial_replications < 2:
+        raise ValueError("initial_replications must be at least 2 to estimate the variance")
+    if budget is not None and budget < initial_replications * len(experiments):
+        raise ValueError("budget does not cover the initial replications")
+    experiment_seeds = np.random.SeedSequence(seed).spawn(len(experiments))
+    results = [[] for _ in experiments]
+    widths = [math.inf] * len(experiments)
+    new_replications = {i: initial_replications for i in range(len(experiments))}
+    used = 0
+
+    pool = None if max_workers == 1 else ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        while new_replications:
+            owners = []
+            tasks = []
+            for i, count in new_replications.items():
+                #spawn continues with the next children, so these are replications len(results[i]) onwards
+                for seed_sequence in experiment_seeds[i].spawn(count):
+                    owners.append(i)
+                    tasks.append((experiments[i], seed_sequence))
+            for i, result in zip(owners, map(_run_replication, tasks) if pool is None else pool.map(_run_replication, tasks)):
+                results[i].append(result)
+            used += len(tasks)
+
+            values = [collect_results(experiment_results, experiment.get('num_queues', 2)) for experiment_results, experiment in zip(results, experiments)]
+            widths = [relative_half_width(experiment_values, metrics, confidence) for experiment_values in values]
+            available = round_size if budget is None else min(round_size, budget - used)
+            new_replications = allocate_replications(widths, [len(experiment_results) for experiment_results in results], target, available)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for i, width in enumerate(widths):
+        print(f"experiment {i}: {len(results[i])} replications, relative half-width {width:.4g}{'' if width <= target else ' (target not met)'}")
+    return values, widths
+
+def run_replications(arrival_distributions, service_distributions, num_jobs, jackson, num_queues, num_replications, seed=None, max_workers=None, mode='event', **options):
+    experiment = {'arrival_distributions': arrival_distributions, 'service_distributions': service_distributions,
+                  'num_jobs': num_jobs, 'jackson': jackson, 'num_queues': num_queues, 'mode': mode, **options}
+    return run_experiments([experiment], num_replications, seed, max_workers)[0]
+
+
+#per metric lists of replication values, per queue metrics as [queue][replication]
+def collect_results(results, num_queues):
+    values = {metric: [result[metric] for result in results] for metric in SYSTEM_METRICS}
+    for metric in QUEUE_METRICS:
+        values[metric] = [[result[metric][k] for result in results] for k in range(num_queues)]
+    return values
+
+#(mean, error) of every metric via simulationplot.compute_ci, per queue metrics as a list of (mean, error)
+def summarize(values, confidence=0.95):
+    summary = {metric: simulationplot.compute_ci(values[metric], confidence) for metric in SYSTEM_METRICS}
+    for metric in QUEUE_METRICS:
+        summary[metric] = [simulationplot.compute_ci(queue_values, confidence) for queue_values in values[metric]]
+    return summary
+
+#(mean, error) of the replication by replication differences first - second of every metric, for two experiments
+#run with common_random_numbers=True (replication r of both on the same seed). same layout as summarize
+def paired_difference(first, second, confidence=0.95):
+    differences = {metric: [a - b for a, b in zip(first[metric], second[metric])] for metric in SYSTEM_METRICS}
+    for metric in QUEUE_METRICS:
+        differences[metric] = [[a - b for a, b in zip(first_queue, second_queue)] for first_queue, second_queue in zip(first[metric], second[metric])]
+    return summarize(differences, confidence)
@@ -1,11 +1,14 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
-from collections import deque
-from scipy.stats import t
-import os,sys
-from scipy import stats
+
+#scipy and matplotlib are imported where they are needed, so importing this module is cheap.
+#figures are matplotlib.figure.Figure objects saved with the Agg canvas: no display, no global pyplot figures left open
 
 def compute_ci(sample, confidence=0.95):
+    from scipy import stats
     n = len(sample)
     mean = np.mean(sample)
     std_dev = np.std(sample, ddof=1)  # Sample standard deviation
@@ -16,23 +19,93 @@ def compute_ci(sample, confidence=0.95):
     
     return mean, margin_of_error
 
-def plot(configurations, poisson_means, poisson_errors, uniform_means, uniform_errors, jackson_values, ylabel):
+#one figure per call, drawn on a standalone Agg figure (headless, no pyplot state) that is freed once saved
+def plot(configurations, poisson_means, poisson_errors, uniform_means, uniform_errors, jackson_values, ylabel, directory='.'):
+	from matplotlib.figure import Figure
 	# Plotting
-	plt.figure(figsize=(10, 6))
+	fig = Figure(figsize=(10, 6))
+	ax = fig.add_subplot()
 
-	plt.errorbar(configurations, poisson_means, yerr=poisson_errors, fmt='o', label='poisson(arrival=2)_simulation(95%CI)', color='blue', capsize=5)
+	ax.errorbar(configurations, poisson_means, yerr=poisson_errors, fmt='o', label='poisson(arrival=2)_simulation(95%CI)', color='blue', capsize=5)
 
-	plt.errorbar(configurations, uniform_means, yerr=uniform_errors, fmt='^', label='uniform(arrival)_simulation(95%CI)', color='green', capsize=5)
+	ax.errorbar(configurations, uniform_means, yerr=uniform_errors, fmt='^', label='uniform(arrival)_simulation(95%CI)', color='green', capsize=5)
 
 	# Plot jackson formula values as a point for each configuration
-	plt.scatter(configurations, jackson_values, color='red', marker='s', label='Jackson formulaValue', zorder=5)
+	ax.scatter(configurations, jackson_values, color='red', marker='s', label='Jackson formulaValue', zorder=5)
 
 	# Customizing the plot
-	plt.xlabel('simulation-params')
-	plt.ylabel(ylabel)
-	plt.xticks(rotation=45)  # Rotate labels for better visibility
-	plt.legend()
-	plt.grid(True)
-	plt.tight_layout()
-
-	plt.savefig(f"plot_{ylabel}.png")
+	ax.set_xlabel('simulation-params')
+	ax.set_ylabel(ylabel)
+	ax.tick_params(axis='x', labelrotation=45)  # Rotate labels for better visibility
+	ax.legend()
+	ax.grid(True)
+	fig.tight_layout()
+
+	fig.savefig(os.path.join(directory, f"plot_{ylabel}.png"))
+
+
+#per metric values of a report, in the order plot takes them
+RESULT_FIELDS = ['poisson_means', 'poisson_errors', 'uniform_means', 'uniform_errors', 'jackson_values']
+
+def result_entry(ylabel, poisson_means, poisson_errors, uniform_means, uniform_errors, jackson_values):
+	values = [poisson_means, poisson_errors, uniform_means, uniform_errors, jackson_values]
+	entry = {'ylabel': ylabel}
+	for field, field_values in zip(RESULT_FIELDS, values):
+		entry[field] = [float(value) for value in field_values]
+	return entry
+
+#the report data: results.json ({'configurations': [...], 'metrics': [result_entry, ...]}) and the same values
+#as results.csv (one row per metric and configuration), so the figures can be redrawn without simulating again
+def write_results(configurations, metrics, path='results.json'):
+	with open(path, 'w') as f:
+		json.dump({'configurations': list(configurations), 'metrics': metrics}, f, indent=2)
+
+	with open(os.path.splitext(path)[0] + '.csv', 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['metric', 'configuration'] + RESULT_FIELDS)
+		for metric in metrics:
+			for k, configuration in enumerate(configurations):
+				writer.writerow([metric['ylabel'], configuration] + [metric[field][k] for field in RESULT_FIELDS])
+	return path
+
+def load_results(path='results.json'):
+	with open(path) as f:
+		return json.load(f)
+
+def _plot_entry(args):
+	configurations, metric, directory = args
+	plot(configurations, *(metric[field] for field in RESULT_FIELDS), metric['ylabel'], directory)
+
+#draws every metric of a results file into plot_<ylabel>.png next to it, one figure per process pool task
+def render_report(path='results.json', max_workers=None):
+	results = load_results(path)
+	directory = os.path.dirname(os.path.abspath(path))
+	tasks = [(results['configurations'], metric, directory) for metric in results['metrics']]
+	if max_workers == 1:
+		list(map(_plot_entry, tasks))
+	else:
+		with ProcessPoolExecutor(max_workers=max_workers) as pool:
+			list(pool.map(_plot_entry, tasks))
+
+#mean length and busy fraction of every queue over simulated time, from TimeSeriesRecorder rows
+#(e.g. timeseries.load_timeseries(path, num_queues)); at most max_points windows are drawn
+def plot_timeseries(series, num_queues, name, max_points=2000):
+	from matplotlib.figure import Figure
+	from timeseries import downsample
+	series = downsample(series, max_points)
+
+	fig = Figure(figsize=(10, 8))
+	length_axis, busy_axis = fig.subplots(2, 1, sharex=True)
+	for k in range(num_queues):
+		length_axis.plot(series[:, 0], series[:, 1 + k], label=f'Queue{k}')
+		busy_axis.plot(series[:, 0], series[:, 1 + num_queues + k], label=f'Queue{k}')
+
+	length_axis.set_ylabel('Mean number of jobs')
+	busy_axis.set_ylabel('Busy fraction')
+	busy_axis.set_xlabel('simulated time')
+	for axis in (length_axis, busy_axis):
+		axis.legend()
+		axis.grid(True)
+	fig.tight_layout()
+
+	fig.savefig(f"timeseries_{name}.png")
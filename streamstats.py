@@ -0,0 +1,154 @@
+import math
+
+
+#exactly rounded mean of all values (math.fsum), the post-hoc counterpart of RunningStats.mean
+def exact_mean(values):
+    if len(values) == 0:
+        return math.nan
+    return math.fsum(values) / len(values)
+
+
+#values RunningStats buffers before folding them into its partials
+FOLD_SIZE = 4096
+
+
+#running statistics of a stream of values, O(1) memory.
+#the mean uses an exact sum, so it equals exact_mean of the same values bit for bit: the values are buffered and every
+#FOLD_SIZE values folded into a few floats whose exact sum is the sum so far. the variance uses Welford's update
+class RunningStats:
+    def __init__(self, quantiles=()):
+        self.count = 0
+        self.partials = []
+        self.pending = []
+        self.running_mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.quantile_sketches = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, value):
+        self.count += 1
+        self.pending.append(value)
+        if len(self.pending) == FOLD_SIZE:
+            self.fold()
+
+        delta = value - self.running_mean
+        self.running_mean += delta / self.count
+        self.m2 += delta * (value - self.running_mean)
+
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        for sketch in self.quantile_sketches.values():
+            sketch.add(value)
+
+    def mean(self):
+        if self.count == 0:
+            return math.nan
+        return math.fsum(self.partials + self.pending) / self.count
+
+    #replaces partials + pending by their correctly rounded sum (math.fsum) and the rounded remainders, until nothing
+    #remains. an inf or nan sum is kept as it is
+    def fold(self):
+        values = self.partials + self.pending
+        partials = []
+        total = math.fsum(values)
+        while total and math.isfinite(total):
+            partials.append(total)
+            total = math.fsum(values + [-partial for partial in partials])
+        if not math.isfinite(total):
+            partials = [total]
+        self.partials = partials
+        self.pending = []
+
+    #sample variance (ddof=1)
+    def variance(self):
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def quantile(self, p):
+        return self.quantile_sketches[p].value()
+
+
+#P-square quantile estimator (Jain & Chlamtac 1985): tracks one quantile with 5 markers
+class P2Quantile:
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired_positions = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        q = self.heights
+        if len(q) < 5:
+            q.append(value)
+            q.sort()
+            return
+
+        n = self.positions
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired_positions[i] += self.increments[i]
+
+        #adjust the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired_positions[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self.parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def parabolic(self, i, d):
+        q = self.heights
+        n = self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                                                   + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        q = self.heights
+        if not q:
+            return math.nan
+        if len(q) < 5:
+            return q[min(len(q) - 1, int(round(self.p * (len(q) - 1))))]
+        return q[2]
+
+
+#means of consecutive groups of batch_size values (e.g. the 5-job batches MSER-5 works on), memory num_values / batch_size.
+#add returns whether the value completed a batch
+class BatchRecorder:
+    def __init__(self, batch_size=5):
+        self.batch_size = batch_size
+        self.batch_means = []
+        self.batch_sum = 0.0
+        self.batch_count = 0
+
+    def add(self, value):
+        self.batch_sum += value
+        self.batch_count += 1
+        if self.batch_count == self.batch_size:
+            self.batch_means.append(self.batch_sum / self.batch_size)
+            self.batch_sum = 0.0
+            self.batch_count = 0
+            return True
+        return False
@@ -0,0 +1,135 @@
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
+import replication
+import simulationplot
+
+#sources the simulation results depend on: editing any of them invalidates the cached results
+SOURCE_FILES = ['eventstack.py', 'streamstats.py', 'tandemqueuesimulator2.py', 'replication.py', 'traces.py']
+DEFAULT_CACHE_DIR = 'sweep_cache'
+DEFAULT_MAX_CACHE_BYTES = 100 * 1024**2
+
+
+#every combination of the grid values as a run_replication experiment dict.
+#a service_distributions entry is either one dict per queue or a single dict used for every queue
+def grid(arrival_distributions, service_distributions, num_queues=(2,), num_jobs=(500000,), jackson=False, **options):
+    experiments = []
+    for arrival, service, queues, jobs in itertools.product(arrival_distributions, service_distributions, num_queues, num_jobs):
+        services = [service] * queues if isinstance(service, dict) else list(service)
+        if len(services) != queues:
+            raise ValueError(f"{len(services)} service distributions for {queues} queues")
+        arrivals = [arrival] if isinstance(arrival, dict) else list(arrival)
+        experiments.append({'arrival_distributions': arrivals, 'service_distributions': services,
+                            'num_jobs': jobs, 'jackson': jackson, 'num_queues': queues, **options})
+    return experiments
+
+def _canonical(value):
+    #numpy arrays/scalars in distribution params
+    return json.dumps(value, sort_keys=True, default=lambda item: item.tolist())
+
+def code_version():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCE_FILES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+#the seed of a point depends only on its configuration and the root seed, not on the other points of the sweep,
+#so a cached point has the same value whichever sweep computed it
+def experiment_seed(experiment, seed):
+    config_hash = hashlib.sha256(_canonical(experiment).encode()).digest()
+    return np.random.SeedSequence([seed if seed is not None else 0, int.from_bytes(config_hash[:16], 'little')])
+
+#(path, size, modification time) of every trace file the experiment replays: a rewritten trace is a new configuration
+def trace_files(experiment):
+    distributions = list(experiment['arrival_distributions']) + list(experiment['service_distributions'])
+    files = []
+    for distribution in distributions:
+        if distribution is not None and distribution['type'] == 'trace':
+            stat = os.stat(distribution['params']['path'])
+            files.append([distribution['params']['path'], stat.st_size, stat.st_mtime_ns])
+    return files
+
+def cache_key(experiment, num_replications, seed, batch, version):
+    key = {'experiment': experiment, 'num_replications': num_replications, 'seed': seed, 'batch': batch, 'code_version': version,
+           'trace_files': trace_files(experiment)}
+    return hashlib.sha256(_canonical(key).encode()).hexdigest()
+
+
+#directory of <key>.json result files, capped at max_bytes by evicting the least recently used.
+#a read refreshes the file's modification time, which is what the LRU order goes by
+class ResultCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                values = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(self.path(key))
+        return values
+
+    def put(self, key, values):
+        tmp_path = self.path(key) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(values, f)
+        os.replace(tmp_path, self.path(key))
+
+    #removes the least recently used entries until the cache fits in max_bytes, returns the removed keys
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            removed.append(name[:-len('.json')])
+        return removed
+
+
+#replication results (replication.collect_results format) of every experiment, in order.
+#only the experiments without a cached result for (config, num_replications, seed, batch, code version) are simulated
+def sweep(experiments, num_replications, seed=None, max_workers=None, batch=False, cache_dir=DEFAULT_CACHE_DIR, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES):
+    cache = ResultCache(cache_dir, max_cache_bytes)
+    version = code_version()
+    keys = [cache_key(experiment, num_replications, seed, batch, version) for experiment in experiments]
+    results = [cache.get(key) for key in keys]
+
+    missing = [i for i, values in enumerate(results) if values is None]
+    if missing:
+        print(f"sweep: {len(experiments) - len(missing)} cached, simulating {len(missing)} configurations")
+        computed = replication.run_experiments([experiments[i] for i in missing], num_replications, seed, max_workers, batch,
+                                               experiment_seeds=[experiment_seed(experiments[i], seed) for i in missing])
+        for i, values in zip(missing, computed):
+            cache.put(keys[i], values)
+            results[i] = values
+    cache.evict()
+    return results
+
+#(means, errors) of a metric over the sweep points, the lists simulationplot.plot takes. queue selects a per queue metric
+def metric_ci(results, metric, queue=None, confidence=0.95):
+    means = []
+    errors = []
+    for values in results:
+        samples = values[metric] if queue is None else values[metric][queue]
+        mean, error = simulationplot.compute_ci(samples, confidence)
+        means.append(mean)
+        errors.append(error)
+    return means, errors
@@ -1,74 +1,364 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from collections import deque
-from scipy.stats import t
-import os,sys
-from eventstack import Event, EventStack, Job, EventType
+from eventstack import Event, EventType, JobStore, make_event_stack
+from streamstats import RunningStats, BatchRecorder, exact_mean
+import estimation
+import traces
 import time
+import heapq
+import os
+import pickle
 
 
-def generate_times_from_distribution(num_samples, distribution):
+#number of uniforms one sample of the distribution is built from
+def uniforms_per_sample(distribution):
+    distribution_type = distribution['type']
+    params = distribution['params']
+
+    if distribution_type in ('uniform', 'exponential', 'empirical'):
+        return 1
+    elif distribution_type == 'erlang':
+        return params.get('k', 1)
+    elif distribution_type == 'hyperexponential':
+        # one uniform picks the phase, one draws the exponential
+        return 2
+    elif distribution_type == 'hypoexponential':
+        return len(params.get('rates', [1.0, 2.0]))
+    else:
+        raise ValueError("Unsupported distribution type.")
+
+#transforms uniforms of shape sample_shape + (uniforms_per_sample,) into times of shape sample_shape
+def times_from_uniforms(uniform_samples, distribution):
     distribution_type = distribution['type']
     params = distribution['params']
 
     if distribution_type == 'uniform':
-        times = np.random.uniform(0, 1, num_samples)
+        times = uniform_samples[..., 0]
     
     elif distribution_type == 'exponential':
         rate = params.get('rate', 1.0)
-        uniform_samples = np.random.uniform(0, 1, num_samples)
-        times = -np.log(uniform_samples) / rate
+        times = -np.log(uniform_samples[..., 0]) / rate
 
     elif distribution_type == 'erlang':
         # Erlang Distribution (sum of k exponential phases)
         rate = params.get('rate', 1.0)
-        k = params.get('k', 1)
-        uniform_samples = np.random.uniform(0, 1, (num_samples, k))
-        times = np.sum(-np.log(uniform_samples) / rate, axis=1)
+        times = np.sum(-np.log(uniform_samples) / rate, axis=-1)
 
     elif distribution_type == 'hyperexponential':
         # Hyperexponential Distribution (mixture of different rates)
         rates = np.array(params.get('rates', [1.0, 2.0]))
         probs = np.array(params.get('probs', [0.5, 0.5]))
-        chosen_rates = np.random.choice(rates, size=num_samples, p=probs)
-        uniform_samples = np.random.uniform(0, 1, num_samples)
-        times = -np.log(uniform_samples) / chosen_rates
+        # same inverse cdf phase selection as np.random.choice(rates, p=probs)
+        cdf = np.cumsum(probs)
+        cdf /= cdf[-1]
+        chosen_rates = rates[np.searchsorted(cdf, uniform_samples[..., 0], side='right')]
+        times = -np.log(uniform_samples[..., 1]) / chosen_rates
 
     elif distribution_type == 'hypoexponential':
         # Hypoexponential Distribution (sequential phases with different rates)
         rates = np.array(params.get('rates', [1.0, 2.0]))
-        num_phases = len(rates)
-        uniform_samples = np.random.uniform(0, 1, (num_samples, num_phases))
-        times = np.sum(-np.log(uniform_samples) / rates, axis=1)
+        times = np.sum(-np.log(uniform_samples) / rates, axis=-1)
+
+    elif distribution_type == 'empirical':
+        # inverse cdf interpolated in a quantile table (probs ascending from 0 to 1), e.g. traces.empirical_distribution
+        quantiles = np.asarray(params['quantiles'], dtype=np.float64)
+        probs = np.asarray(params.get('probs', np.linspace(0, 1, len(quantiles))), dtype=np.float64)
+        times = np.interp(uniform_samples[..., 0], probs, quantiles)
 
     else:
         raise ValueError("Unsupported distribution type.")
 
     return times
 
+#rng is a np.random.Generator, by default the global np.random state is used.
+#every sample consumes its uniforms consecutively, so drawing n samples in chunks gives the same times as drawing them at once.
+#num_samples can also be a shape, e.g. (R, num_jobs) for R replications of num_jobs times each.
+#antithetic=True transforms 1 - u instead of u: the same generator state gives the antithetic times.
+#trace_start: first trace row to read for 'trace' distributions (a chunked reader passes its position)
+def generate_times_from_distribution(num_samples, distribution, rng=None, antithetic=False, trace_start=0):
+    shape = tuple(np.atleast_1d(num_samples))
+    if distribution['type'] == 'trace':
+        #recorded times instead of samples: rows trace_start onwards, rng and antithetic do not apply
+        num_values = int(np.prod(shape))
+        if traces.trace_length(distribution) < trace_start + num_values:
+            raise ValueError(f"trace {distribution['params']['path']} has fewer than {trace_start + num_values} rows")
+        return traces.read_trace(distribution, trace_start, num_values).reshape(shape)
+    if rng is None:
+        rng = np.random
+    uniform_samples = rng.uniform(0, 1, shape + (uniforms_per_sample(distribution),))
+    if antithetic:
+        uniform_samples = 1 - uniform_samples
+    return times_from_uniforms(uniform_samples, distribution)
+
+
+#sequential source of variates, refilled chunk_size samples at a time from its own generator
+class VariateStream:
+    def __init__(self, distribution, rng=None, chunk_size=65536, antithetic=False):
+        self.distribution = distribution
+        self.rng = rng
+        self.chunk_size = chunk_size
+        self.antithetic = antithetic
+        self.buffer = []
+        self.position = 0
+        #rows of a 'trace' distribution read so far
+        self.trace_position = 0
+
+    #stream over already generated times (the eager, whole run case)
+    @classmethod
+    def from_array(cls, times):
+        stream = cls(None, None, len(times))
+        stream.buffer = times
+        return stream
+
+    def refill(self):
+        if self.distribution is None:
+            raise IndexError("variate stream exhausted")
+        #a list makes the per event access cheaper than indexing a numpy array
+        if self.distribution['type'] == 'trace':
+            self.buffer = traces.read_trace(self.distribution, self.trace_position, self.chunk_size).tolist()
+            self.trace_position += len(self.buffer)
+            if not self.buffer:
+                raise IndexError(f"trace {self.distribution['params']['path']} exhausted")
+        else:
+            self.buffer = generate_times_from_distribution(self.chunk_size, self.distribution, self.rng, self.antithetic).tolist()
+        self.position = 0
+
+    def next(self):
+        if self.position == len(self.buffer):
+            self.refill()
+        value = self.buffer[self.position]
+        self.position += 1
+        return value
+
+    #next num_samples values as an array
+    def take(self, num_samples):
+        chunks = []
+        while num_samples > 0:
+            if self.position == len(self.buffer):
+                self.refill()
+            chunk = self.buffer[self.position:self.position + num_samples]
+            self.position += len(chunk)
+            num_samples -= len(chunk)
+            chunks.append(np.asarray(chunk, dtype=np.float64))
+        if len(chunks) == 1:
+            return chunks[0]
+        return np.concatenate(chunks) if chunks else np.empty(0)
+
+    #pickled with only the unread part of the buffer, the generator state continues after it
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['buffer'] = np.asarray(self.buffer[self.position:], dtype=np.float64)
+        state['position'] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.buffer = self.buffer.tolist()
+
+
+#departure times of a FIFO single server queue (Lindley recursion): D[i] = max(D[i-1], A[i]) + S[i]
+#the operations are the same as process_event so the results match the event engine bit for bit
+def _fifo_departures_loop(arrival_times, service_times):
+    departures = []
+    free_at = 0.0
+    for arrival, service in zip(arrival_times.tolist(), service_times.tolist()):
+        free_at = (free_at if free_at > arrival else arrival) + service
+        departures.append(free_at)
+    return np.array(departures)
+
+#compiled version of the same loop when numba is installed. numba is only imported
+#the first time the recursion engine runs, importing this module stays cheap
+_fifo_departures_compiled = None
+
+def _compile_fifo_departures():
+    try:
+        from numba import njit
+    except ImportError:
+        return _fifo_departures_loop
+
+    @njit(cache=True)
+    def fifo_departures_compiled(arrival_times, service_times):
+        departures = np.empty(arrival_times.shape[0])
+        free_at = 0.0
+        for i in range(arrival_times.shape[0]):
+            free_at = (free_at if free_at > arrival_times[i] else arrival_times[i]) + service_times[i]
+            departures[i] = free_at
+        return departures
+
+    return lambda arrival_times, service_times: fifo_departures_compiled(np.ascontiguousarray(arrival_times, dtype=np.float64),
+                                                                         np.ascontiguousarray(service_times, dtype=np.float64))
+
+def fifo_departures(arrival_times, service_times):
+    global _fifo_departures_compiled
+    if _fifo_departures_compiled is None:
+        _fifo_departures_compiled = _compile_fifo_departures()
+    return _fifo_departures_compiled(arrival_times, service_times)
+
+
+#R replications of a FIFO single server tandem line advanced in lockstep, the replications along the first array axis.
+#jobs are fed in chunks; per queue the Lindley recursion is evaluated in its max-plus form
+#D[i] = C[i] + max(F, max_{j<=i} (A[j] - C[j] + S[j])) with C the cumulative service times of the chunk and
+#F the time the server frees up after the previous chunk, so a chunk is a few array operations instead of a Python loop.
+#the results agree with the recursion/event engines up to rounding, the sums are taken in a different order
+class TandemBatch:
+    def __init__(self, num_replications, num_queues):
+        self.num_replications = num_replications
+        self.num_queues = num_queues
+        self.num_jobs = 0
+        self.last_arrival_times = np.zeros(num_replications)
+        self.server_free_times = np.zeros((num_queues, num_replications))
+        self.busy_times = np.zeros((num_queues, num_replications))
+        self.sojourn_time_sums = np.zeros((num_queues, num_replications))
+        self.system_sojourn_time_sums = np.zeros(num_replications)
+
+    #inter_arrivaltimes: (R, n), servicetimes: one (R, n) array per queue, for the next n jobs
+    def advance(self, inter_arrivaltimes, servicetimes):
+        inter_arrivaltimes = np.array(inter_arrivaltimes, dtype=np.float64)
+        #continue from the previous chunk's last arrival, adding in the same order as one cumsum over the whole run
+        inter_arrivaltimes[:, 0] += self.last_arrival_times
+        arrival_times = np.cumsum(inter_arrivaltimes, axis=1)
+        self.last_arrival_times = arrival_times[:, -1]
+        system_sojourn_times = np.zeros_like(arrival_times)
+
+        for i in range(self.num_queues):
+            service_times = np.asarray(servicetimes[i], dtype=np.float64)
+            cumulative_service = np.cumsum(service_times, axis=1)
+            latest_start = np.maximum.accumulate(arrival_times - cumulative_service + service_times, axis=1)
+            departure_times = cumulative_service + np.maximum(latest_start, self.server_free_times[i][:, None])
+
+            sojourn_times = departure_times - arrival_times
+            self.busy_times[i] += service_times.sum(axis=1)
+            self.sojourn_time_sums[i] += sojourn_times.sum(axis=1)
+            system_sojourn_times += sojourn_times
+            self.server_free_times[i] = departure_times[:, -1]
+            arrival_times = departure_times
+
+        self.system_sojourn_time_sums += system_sojourn_times.sum(axis=1)
+        self.num_jobs += inter_arrivaltimes.shape[1]
+
+    #per replication statistics, named like the TandemQueueSimulator attributes; per queue values have shape (R, num_queues).
+    #every job has left when the last one leaves the last queue, so the time weighted queue length is the sum of the sojourn times
+    def results(self):
+        simulation_times = self.server_free_times[-1]
+        mean_jobcounts = (self.sojourn_time_sums / simulation_times).T
+        return {
+            'throughput': self.num_jobs / simulation_times,
+            'queue_utilizations': (self.busy_times / simulation_times).T,
+            'mean_jobcounts': mean_jobcounts,
+            'overall_mean_jobcount': mean_jobcounts.sum(axis=1),
+            'mean_soujorntime_perqueue': (self.sojourn_time_sums / self.num_jobs).T,
+            'overall_mean_soujorntime': self.system_sojourn_time_sums / self.num_jobs,
+        }
+
+#batch run over given times, e.g. generate_times_from_distribution((R, num_jobs), ...) output
+def simulate_batch_from_times(inter_arrivaltimes, servicetimes, chunk_size=65536):
+    inter_arrivaltimes = np.asarray(inter_arrivaltimes)
+    batch = TandemBatch(inter_arrivaltimes.shape[0], len(servicetimes))
+    for start in range(0, inter_arrivaltimes.shape[1], chunk_size):
+        batch.advance(inter_arrivaltimes[:, start:start + chunk_size], [times[:, start:start + chunk_size] for times in servicetimes])
+    return batch.results()
+
+#num_replications replications of the tandem line, chunk_size jobs at a time.
+#replication r draws from replication_rngs[r] (by default spawned from rng) exactly like
+#TandemQueueSimulator(..., rng=replication_rngs[r]) does, so its results match that simulator's run up to rounding
+def simulate_batch(num_replications, arrival_distributions, service_distributions, num_jobs, num_queues=2, rng=None, replication_rngs=None, chunk_size=65536, antithetic=False):
+    if replication_rngs is None:
+        replication_rngs = spawn_rngs(rng, num_replications)
+    stream_rngs = [spawn_rngs(replication_rng, 1 + num_queues) for replication_rng in replication_rngs]
+
+    batch = TandemBatch(num_replications, num_queues)
+    for start in range(0, num_jobs, chunk_size):
+        size = min(chunk_size, num_jobs - start)
+        inter_arrivaltimes = np.stack([generate_times_from_distribution(size, arrival_distributions[0], streams[0], antithetic, start) for streams in stream_rngs])
+        servicetimes = [np.stack([generate_times_from_distribution(size, service_distributions[i], streams[1 + i], antithetic, start) for streams in stream_rngs])
+                        for i in range(num_queues)]
+        batch.advance(inter_arrivaltimes, servicetimes)
+    return batch.results()
+
+
+#one independent generator per stream, the first num_streams children of rng's SeedSequence (or of the global np.random state).
+#built from the spawn key instead of with rng.spawn, which advances the SeedSequence's child counter: an rng seeded with
+#a SeedSequence shared by several runs (common random numbers, antithetic pairs) gives every run the same streams
+def spawn_rngs(rng, num_streams):
+    if rng is None:
+        rng = np.random.default_rng(np.random.randint(0, 2**32))
+    seed_sequence = rng.bit_generator.seed_seq
+    return [np.random.Generator(type(rng.bit_generator)(np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (i,),
+                                                                                pool_size=seed_sequence.pool_size)))
+            for i in range(num_streams)]
+
+#traffic equations of an open network, lambda = gamma + lambda P, i.e. (I - P^T) lambda = gamma
+def solve_traffic_equations(external_arrival_rates, routing_matrix):
+    routing_matrix = np.asarray(routing_matrix, dtype=np.float64)
+    return np.linalg.solve(np.eye(len(routing_matrix)) - routing_matrix.T, np.asarray(external_arrival_rates, dtype=np.float64))
+
+
+#Erlang C: probability that a job has to wait in an M/M/c queue with offered load a = lambda/mu
+def erlang_c(num_servers, offered_load):
+    utilization = offered_load / num_servers
+    if utilization >= 1:
+        return 1.0
+    #sum of a^k/k! for k < c, built term by term so large c does not overflow
+    term = 1.0
+    terms_sum = 0.0
+    for k in range(num_servers):
+        terms_sum += term
+        term *= offered_load / (k + 1)
+    waiting_term = term / (1 - utilization)
+    return waiting_term / (terms_sum + waiting_term)
+
 
 class TandemQueueSimulator:
-    def __init__(self, arrival_distributions, service_distributions, num_jobs, jackson, num_queues=2):
+    def __init__(self, arrival_distributions, service_distributions, num_jobs, jackson, num_queues=2, event_stack_type='heap', trace_events=False, rng=None, streaming_stats=False, quantiles=(), chunk_size=None, num_servers=None, antithetic=False):
         self.arrival_rates = []
         self.service_rates = []
         
         if jackson:
-            self.arrival_rates = [arrival_distribution['params'].get('rate') for arrival_distribution in arrival_distributions]
+            self.arrival_rates = [arrival_distribution['params'].get('rate') if arrival_distribution is not None else 0 for arrival_distribution in arrival_distributions]
             self.service_rates = [service_distribution['params'].get('rate') for service_distribution in service_distributions]
 
         self.num_jobs = num_jobs
         self.num_queues = num_queues
-        self.event_stack = EventStack()
+        #'heap' or 'linkedlist', both pop events in the same order (FIFO among equal times)
+        self.event_stack_type = event_stack_type
+        self.event_stack = make_event_stack(event_stack_type)
+        #optional (time, type, queueid, job_id) log of every processed event, to A/B event stacks
+        self.event_trace = [] if trace_events else None
         self.current_time = 0
         self.next_job_id = 0
-        self.jobs = []
         self.jobsdone = 0
         self.jackson = jackson
+        self.mode = 'event'
+        #streaming statistics: no Job objects, sojourn/wait accumulators are updated at every departure
+        #and only the jobs currently in the system are kept as job_id -> [arrival time, service time, sojourn so far]
+        self.streaming_stats = streaming_stats
+        self.pending_jobs = {}
+        #quantiles: optional P-square quantile sketches of the sojourn time in the system (e.g. (0.5, 0.95))
+        self.sojourn_stats = [RunningStats() for _ in range(self.num_queues)]
+        self.wait_stats = [RunningStats() for _ in range(self.num_queues)]
+        self.system_sojourn_stats = RunningStats(quantiles)
+        #5-job batch means of the system sojourn times in departure order and the cumulative counters after every
+        #5-job batch (see batch_counters), only kept by run_estimation
+        self.sojourn_batches = None
+        self.counters = None
+        #otherwise per job arrival/service/departure times go to a columnar (num_jobs, num_queues) store
+        self.job_store = None if streaming_stats else JobStore(num_jobs, num_queues)
+        #optional TimeSeriesRecorder, see record_timeseries
+        self.timeseries = None
+        #event types are shared by all events instead of one per event
+        self.arrival_types = [EventType('arrival', i) for i in range(self.num_queues)]
+        self.departure_types = [EventType('departure', i) for i in range(self.num_queues)]
 
         #for statistical purpose
         self.queue_lengths = [0] * self.num_queues
         self.prev_event_time = 0;
         self.queue_idletimes = [0] * self.num_queues
+        #parallel servers per queue. a single server queue chains departures through queue_idletimes,
+        #a multi server queue keeps the free-at times of its servers in a min-heap (O(log c) per job)
+        self.num_servers = list(num_servers) if num_servers is not None else [1] * self.num_queues
+        self.server_free_times = [[0] * c if c > 1 else None for c in self.num_servers]
+        #multi server queues let jobs overtake each other, trace rows would no longer pair up across stations
+        if any(c > 1 for c in self.num_servers) and any(isinstance(distribution, dict) and traces.is_trace(distribution) for distribution in service_distributions):
+            raise ValueError("trace service times need single server queues (num_servers 1)")
         self.time_weighted_job_counts_in_queues = [0] * self.num_queues
         self.mean_jobcounts = [0] * self.num_queues
         self.overall_mean_jobcount = 0;
@@ -78,11 +368,9 @@ class TandemQueueSimulator:
         self.mean_soujorntime_perqueue = [0] * self.num_queues
         self.throughput = 0;
 
-        #in tandem queues, only the first queue has external arrival
-        self.inter_arrivaltimes = generate_times_from_distribution(num_jobs, arrival_distributions[0])
-        self.servicetimes = [[] for _ in range(self.num_queues)]
-        for i in range(self.num_queues):
-            self.servicetimes[i] = generate_times_from_distribution(num_jobs, service_distributions[i])
+        #antithetic run: every stream transforms 1 - u, paired with the run on the same rng it is negatively correlated
+        self.antithetic = antithetic
+        self.create_streams(arrival_distributions, service_distributions, rng, chunk_size)
 
         #jackson formulated values
         self.jackson_system_throughput = np.sum(self.arrival_rates)
@@ -90,8 +378,32 @@ class TandemQueueSimulator:
         self.jackson_avg_queue_length = [0] * self.num_queues
         self.jackson_mean_sojourn_time_perqueue = [0] * self.num_queues
         self.jackson_avg_jobs_in_system = 0
+        self.jackson_wait_probability = [0] * self.num_queues
         self.jackson_mean_sojourn_time_in_system = 0
 
+
+    #in tandem queues, only the first queue has external arrival
+    #with an rng every stream (arrivals, then each queue's services) draws from its own spawned generator,
+    #which makes the times the same whether they are generated up front or chunk_size at a time
+    def create_streams(self, arrival_distributions, service_distributions, rng, chunk_size):
+        if rng is None and chunk_size is None:
+            stream_rngs = [None] * (1 + self.num_queues)
+        else:
+            stream_rngs = spawn_rngs(rng, 1 + self.num_queues)
+
+        if chunk_size is None:
+            self.inter_arrivaltimes = generate_times_from_distribution(self.num_jobs, arrival_distributions[0], stream_rngs[0], self.antithetic)
+            self.servicetimes = [[] for _ in range(self.num_queues)]
+            for i in range(self.num_queues):
+                self.servicetimes[i] = generate_times_from_distribution(self.num_jobs, service_distributions[i], stream_rngs[1 + i], self.antithetic)
+            self.arrival_stream = VariateStream.from_array(self.inter_arrivaltimes)
+            self.service_streams = [VariateStream.from_array(times) for times in self.servicetimes]
+        else:
+            #chunked: only chunk_size times per stream are in memory at a time
+            self.inter_arrivaltimes = None
+            self.servicetimes = None
+            self.arrival_stream = VariateStream(arrival_distributions[0], stream_rngs[0], chunk_size, self.antithetic)
+            self.service_streams = [VariateStream(service_distributions[i], stream_rngs[1 + i], chunk_size, self.antithetic) for i in range(self.num_queues)]
         
     #arrival rate
     def generate_interarrival_time(self, queueid = 0):
@@ -107,36 +419,226 @@ class TandemQueueSimulator:
         return np.random.exponential(1 / self.service_rates[queueid])
 
     #simulation start
-    def run_simulation(self, first_queueid=0):
+    #mode='event' runs the discrete event loop, mode='recursion' computes the same FIFO tandem line directly from the departure recursion
+    #profiler: optional instrumentation.SimulationProfiler, the event loop then runs in its timed version
+    #with checkpoint_path the run is saved there every checkpoint_every completed jobs (see save_checkpoint)
+    def run_simulation(self, first_queueid=0, mode='event', profiler=None, checkpoint_path=None, checkpoint_every=1000000):
+        if mode == 'recursion':
+            self.run_recursion()
+            return
+        if mode != 'event':
+            raise ValueError(f"Unsupported simulation mode: {mode}")
+
+        if profiler is not None:
+            profiler.run(self, first_queueid)
+        elif checkpoint_path is not None:
+            self.schedule_first_arrivals(first_queueid)
+            self.run_checkpointed(checkpoint_path, checkpoint_every)
+        else:
+            self.schedule_first_arrivals(first_queueid)
+            self.run_events()
+
+        self.finish_simulation()
+
+    #continues a simulator restored with from_checkpoint up to num_jobs, optionally checkpointing on the way
+    def resume_simulation(self, checkpoint_path=None, checkpoint_every=1000000):
+        if checkpoint_path is not None:
+            self.run_checkpointed(checkpoint_path, checkpoint_every)
+        else:
+            self.run_events()
+        self.finish_simulation()
+
+    #records the queue lengths and busy fractions of the event engine in windows of window simulated time units,
+    #see timeseries.TimeSeriesRecorder. call before run_simulation
+    def record_timeseries(self, window, capacity=4096, path=None):
+        from timeseries import TimeSeriesRecorder
+        self.timeseries = TimeSeriesRecorder(self.num_queues, window, self.num_servers, capacity, path)
+        return self.timeseries
+
+    def finish_simulation(self):
+        print(f"Simulation time: {self.current_time}")
+        if self.timeseries is not None:
+            self.timeseries.flush()
+        #calculate other stats
+        if self.job_store is not None:
+            self.job_store.calulate_jobstats()
+            #print(f"details of job {job_id}")
+            #self.job_store.get_job(job_id).print_jobstats()
+
+    def schedule_first_arrivals(self, first_queueid=0):
         #first_arrival = self.generate_interarrival_time(first_queueid);
-        first_arrival = self.inter_arrivaltimes[0]
-        job = Job(self.next_job_id)
-        job.queueids.append(first_queueid)
-        job.arrival_times.append(first_arrival);
-        self.jobs.append(job)
+        first_arrival = self.arrival_stream.next()
+        self.create_job(self.next_job_id, first_queueid, first_arrival)
         
-        self.event_stack.insert_event(Event(first_arrival, EventType('arrival', first_queueid), self.next_job_id))
+        self.event_stack.insert_event(Event(first_arrival, self.arrival_types[first_queueid], self.next_job_id))
         self.next_job_id += 1
 
-
+    def run_events(self, jobs_done=None):
+        if jobs_done is None:
+            jobs_done = self.num_jobs
         # we run this simulation until certain number of jobs are done
-        while self.jobsdone < self.num_jobs:
+        while self.jobsdone < jobs_done:
             event = self.event_stack.pop_event()
             if event:
                 self.current_time = event.event_time
                 time_spent = self.current_time - self.prev_event_time
                 self.prev_event_time = self.current_time
+                if self.event_trace is not None:
+                    self.event_trace.append((event.event_time, event.event_type.type, event.event_type.queueid, event.job_id))
                 self.process_event(event, time_spent)
+    
+    def run_checkpointed(self, checkpoint_path, checkpoint_every):
+        #fails before the run, not at the first checkpoint
+        self.check_checkpointable()
+        while self.jobsdone < self.num_jobs:
+            self.run_events(min(self.num_jobs, self.jobsdone + checkpoint_every))
+            self.save_checkpoint(checkpoint_path)
+
+    def check_checkpointable(self):
+        if self.job_store is not None or self.inter_arrivaltimes is not None:
+            raise ValueError("checkpoints need streaming_stats=True and chunked variates (chunk_size)")
+
+    #pickles the in-flight run: pending events, queue state, accumulators, generator states and job counters.
+    #with streaming statistics and chunked variates its size is O(pending events + chunk_size), not O(jobs done).
+    #the file is written next to path and then renamed, a run preempted while saving keeps the previous checkpoint
+    def save_checkpoint(self, path):
+        self.check_checkpointable()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    #the restored simulator continues bit for bit where the checkpoint was taken: sim.resume_simulation()
+    @classmethod
+    def from_checkpoint(cls, path):
+        with open(path, 'rb') as f:
+            sim = pickle.load(f)
+        if not isinstance(sim, cls):
+            raise TypeError(f"{path} does not hold a {cls.__name__} checkpoint")
+        return sim
+
+    #the event set is stored as arrays in pop order (event type index, time, job id) instead of the linked
+    #Event objects, and rebuilt by inserting the events in that order, which keeps the FIFO order of equal times
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        events = self.event_stack.pending_events()
+        event_types = []
+        type_indices = {}
+        for event in events:
+            if id(event.event_type) not in type_indices:
+                type_indices[id(event.event_type)] = len(event_types)
+                event_types.append(event.event_type)
+        state['event_stack'] = {
+            'event_types': event_types,
+            'type_indices': np.array([type_indices[id(event.event_type)] for event in events], dtype=np.int32),
+            'times': np.array([event.event_time for event in events], dtype=np.float64),
+            'job_ids': np.array([-1 if event.job_id is None else event.job_id for event in events], dtype=np.int64),
+        }
+        return state
+
+    def __setstate__(self, state):
+        pending = state.pop('event_stack')
+        self.__dict__.update(state)
+        self.event_stack = make_event_stack(self.event_stack_type)
+        event_types = pending['event_types']
+        for type_index, event_time, job_id in zip(pending['type_indices'].tolist(), pending['times'].tolist(), pending['job_ids'].tolist()):
+            self.event_stack.insert_event(Event(event_time, event_types[type_index], None if job_id < 0 else job_id))
+
+    #one long run estimate of the mean sojourn time in the system: MSER-5 deletes the warm-up, batch means give the CI.
+    #self.estimate['cis'] has the (mean, error) of every replication.summarize metric over the same batches.
+    #with rel_half_width (e.g. 0.01) the precision of the sojourn time is checked every check_every jobs, once there
+    #are num_batches 5-job batches, and the run stops as soon as error / mean < rel_half_width, num_jobs is then just
+    #the budget. needs streaming_stats
+    def run_estimation(self, confidence=0.95, num_batches=20, rel_half_width=None, check_every=10000):
+        if not self.streaming_stats:
+            raise ValueError("run_estimation needs streaming_stats=True")
+        self.sojourn_batches = BatchRecorder(5)
+        self.counters = []
+        self.schedule_first_arrivals()
+
+        while self.jobsdone < self.num_jobs:
+            if rel_half_width is None:
+                self.run_events()
+            else:
+                self.run_events(min(self.num_jobs, self.jobsdone + check_every))
+                #no batch means CI before there are num_batches 5-job batches
+                if len(self.sojourn_batches.batch_means) < num_batches:
+                    continue
+                estimate = estimation.estimate(self.sojourn_batches.batch_means, num_batches, confidence)
+                if estimate['error'] < rel_half_width * abs(estimate['mean']):
+                    break
+        self.estimate = estimation.estimate(self.sojourn_batches.batch_means, num_batches, confidence, self.counters, self.num_servers)
 
         print(f"Simulation time: {self.current_time}")
-        #calculate other stats
-        for job in self.jobs:
-            job.calulate_jobstats()
-            #print(f"details of job {job.job_id}")
-            #job.print_jobstats()
-    
+        print(f"Mean sojourn time in system: {self.estimate['mean']} +- {self.estimate['error']} "
+              f"({self.estimate['warmup_observations']} warm-up jobs deleted, {self.jobsdone} jobs simulated)")
+        return self.estimate['mean'], self.estimate['error']
+
+    #called with every system sojourn time while run_estimation records the 5-job batches
+    def record_sojourn_batch(self, sojourn_time):
+        if self.sojourn_batches.add(sojourn_time):
+            self.counters.append(self.batch_counters())
+
+    #[time, time weighted job count of every queue, service time of every queue] so far
+    def batch_counters(self):
+        return [self.current_time] + self.time_weighted_job_counts_in_queues + self.queue_utilizations
+
+    def create_job(self, job_id, queueid, arrival_time):
+        if self.streaming_stats:
+            self.pending_jobs[job_id] = [arrival_time, 0, 0]
+        else:
+            self.job_store.arrival_times[job_id, queueid] = arrival_time
+
+    #FIFO tandem fast path: no events, each queue's departures come from D[i][k] = max(D[i-1][k], D[i][k-1]) + S[i][k]
+    def run_recursion(self):
+        if max(self.num_servers) > 1:
+            raise ValueError("the recursion engine only supports single server queues")
+        self.mode = 'recursion'
+        #np.cumsum adds sequentially, i.e. in the same order the event loop accumulates
+        arrival_times = np.cumsum(self.arrival_stream.take(self.num_jobs))
+        self.job_store = JobStore(self.num_jobs, self.num_queues)
+
+        for i in range(self.num_queues):
+            service_times = self.service_streams[i].take(self.num_jobs)
+            departure_times = fifo_departures(arrival_times, service_times)
+            self.job_store.arrival_times[:, i] = arrival_times
+            self.job_store.service_times[:, i] = service_times
+            self.job_store.depurture_times[:, i] = departure_times
+
+            self.queue_utilizations[i] = np.cumsum(service_times)[-1]
+            #a job waits for the departure of the job in front of it
+            free_times = np.concatenate(([0.0], departure_times[:-1]))
+            self.queue_waittimes[i] = np.cumsum(np.maximum(free_times - arrival_times, 0))[-1]
+            arrival_times = departure_times
+
+        self.accumulate_queue_lengths()
+        self.current_time = self.prev_event_time = self.job_store.depurture_times[-1, -1]
+        self.next_job_id = self.jobsdone = self.num_jobs
+        print(f"Simulation time: {self.current_time}")
+        self.job_store.calulate_jobstats()
+
+    #time weighted queue lengths of the recursion run. replays the event loop accumulation:
+    #every event adds (time since previous event) * (queue length before it), in time order
+    def accumulate_queue_lengths(self):
+        #one arrival event per job into queue 0, one departure event per job and queue (which is also the arrival into the next queue)
+        event_times = np.concatenate([self.job_store.arrival_times[:, 0]] + [self.job_store.depurture_times[:, i] for i in range(self.num_queues)])
+        order = np.argsort(event_times, kind='stable')
+        time_spent = np.diff(event_times[order], prepend=0.0)
+
+        for i in range(self.num_queues):
+            deltas = np.zeros((self.num_queues + 1, self.num_jobs), dtype=np.int64)
+            deltas[i] = 1
+            deltas[i + 1] = -1
+            queue_lengths = np.cumsum(deltas.ravel()[order])
+            queue_lengths_before = np.concatenate(([0], queue_lengths[:-1]))
+            self.time_weighted_job_counts_in_queues[i] = np.cumsum(time_spent * queue_lengths_before)[-1]
+
     def process_event(self, event, time_spent):
         #arrival case: for each arrival, schedule its deperture event. if its inital queue, then create next arrival event in the queue.
+        if self.timeseries is not None:
+            self.timeseries.advance(self.current_time, self.queue_lengths)
         for i in range(self.num_queues):
             self.time_weighted_job_counts_in_queues[i] += time_spent * self.queue_lengths[i]
 
@@ -146,32 +648,26 @@ class TandemQueueSimulator:
             
             #determine service time in this queue
             #service_time = self.generate_service_time(event_queueid)
-            service_time = self.servicetimes[event_queueid][event.job_id]
+            service_time = self.service_streams[event_queueid].next()
             
-            self.jobs[event.job_id].service_times.append(service_time)
+            if self.streaming_stats:
+                self.pending_jobs[event.job_id][1] = service_time
+            else:
+                self.job_store.service_times[event.job_id, event_queueid] = service_time
             self.queue_utilizations[event_queueid] += service_time
 
-            depurture_time = self.current_time + service_time
-            
-            if self.queue_idletimes[event_queueid] > self.current_time:
-                depurture_time = self.queue_idletimes[event_queueid] + service_time
-                self.queue_waittimes[event_queueid] += (self.queue_idletimes[event_queueid] - self.current_time)
-
-            self.queue_idletimes[event_queueid] = depurture_time
+            depurture_time = self.service_departure_time(event_queueid, service_time)
 
             #put deperture event of this job in this queue
-            self.event_stack.insert_event(Event(depurture_time, EventType('departure', event_queueid), event.job_id))
+            self.event_stack.insert_event(Event(depurture_time, self.departure_types[event_queueid], event.job_id))
 
             
             #next_arrival of job if this is the first queue
             if event_queueid == 0 and self.next_job_id < self.num_jobs:
                 #next_arrival = self.generate_interarrival_time(event_queueid)
-                next_arrival = self.inter_arrivaltimes[self.next_job_id]
-                job = Job(self.next_job_id)
-                job.queueids.append(event_queueid)
-                job.arrival_times.append(self.current_time + next_arrival);
-                self.jobs.append(job)
-                self.event_stack.insert_event(Event(self.current_time + next_arrival, EventType('arrival', event_queueid), self.next_job_id))
+                next_arrival = self.arrival_stream.next()
+                self.create_job(self.next_job_id, event_queueid, self.current_time + next_arrival)
+                self.event_stack.insert_event(Event(self.current_time + next_arrival, self.arrival_types[event_queueid], self.next_job_id))
                 self.next_job_id += 1
 
 
@@ -181,32 +677,80 @@ class TandemQueueSimulator:
             event_queueid = event.event_type.queueid
             self.queue_lengths[event_queueid] -= 1
 
-            self.jobs[event.job_id].depurture_times.append(self.current_time)
+            if self.streaming_stats:
+                self.record_departure(event.job_id, event_queueid)
+            else:
+                self.job_store.depurture_times[event.job_id, event_queueid] = self.current_time
 
             if event_queueid != (self.num_queues - 1):
                 next_queueid = event_queueid + 1
                 #put arrival event of this job in next queue
-                self.event_stack.insert_event(Event(self.current_time, EventType('arrival', next_queueid), event.job_id))
-                self.jobs[event.job_id].queueids.append(next_queueid)
-                self.jobs[event.job_id].arrival_times.append(self.current_time)
+                self.event_stack.insert_event(Event(self.current_time, self.arrival_types[next_queueid], event.job_id))
+                if not self.streaming_stats:
+                    self.job_store.arrival_times[event.job_id, next_queueid] = self.current_time
 
             if event_queueid == (self.num_queues - 1):
                 self.jobsdone += 1
                 #print(self.jobsdone)
 
 
+    #FCFS: the arriving job takes the server that frees up first
+    def service_departure_time(self, queueid, service_time):
+        if self.server_free_times[queueid] is None:
+            depurture_time = self.current_time + service_time
+            
+            if self.queue_idletimes[queueid] > self.current_time:
+                depurture_time = self.queue_idletimes[queueid] + service_time
+                self.queue_waittimes[queueid] += (self.queue_idletimes[queueid] - self.current_time)
+
+            self.queue_idletimes[queueid] = depurture_time
+            return depurture_time
+
+        free_times = self.server_free_times[queueid]
+        depurture_time = self.current_time + service_time
+        if free_times[0] > self.current_time:
+            depurture_time = free_times[0] + service_time
+            self.queue_waittimes[queueid] += (free_times[0] - self.current_time)
+        heapq.heapreplace(free_times, depurture_time)
+        return depurture_time
+
+    #streaming counterpart of Job.calulate_jobstats, done when the job leaves the queue
+    def record_departure(self, job_id, queueid):
+        job = self.pending_jobs[job_id]
+        sojourn_time = self.current_time - job[0]
+        self.sojourn_stats[queueid].add(sojourn_time)
+        self.wait_stats[queueid].add(max(0, self.current_time - job[1] - job[0]))
+        job[2] += sojourn_time
+
+        if queueid == (self.num_queues - 1):
+            self.system_sojourn_stats.add(job[2])
+            if self.sojourn_batches is not None:
+                self.record_sojourn_batch(job[2])
+            del self.pending_jobs[job_id]
+        else:
+            #the departure time is the arrival time in the next queue
+            job[0] = self.current_time
+
     def get_total_simulationtime(self):
         return self.current_time
 
     def calculate_statistics(self):        
         for i in range(self.num_queues):
-            self.queue_utilizations[i] = self.queue_utilizations[i] / self.current_time 
+            #busy fraction per server
+            self.queue_utilizations[i] = self.queue_utilizations[i] / (self.current_time * self.num_servers[i])
             self.mean_jobcounts[i] = self.time_weighted_job_counts_in_queues[i] / self.current_time
             self.overall_mean_jobcount += self.mean_jobcounts[i]
-            self.mean_soujorntime_perqueue[i] = np.mean([job.sojourn_times[i] for job in self.jobs])
+            if self.job_store is not None:
+                self.mean_soujorntime_perqueue[i] = exact_mean(self.job_store.sojourn_times[:, i])
+            else:
+                self.mean_soujorntime_perqueue[i] = self.sojourn_stats[i].mean()
        
-        self.overall_mean_soujorntime = np.mean([job.overall_sojourntime for job in self.jobs])
-        self.throughput = self.num_jobs/self.current_time
+        #exact sums on both paths, so the stored and the streaming statistics give the same means
+        if self.job_store is not None:
+            self.overall_mean_soujorntime = exact_mean(self.job_store.overall_sojourntimes)
+        else:
+            self.overall_mean_soujorntime = self.system_sojourn_stats.mean()
+        self.throughput = self.jobsdone/self.current_time
 
     def print_stats(self):
         print(f"simulation system throughput:{self.throughput}")
@@ -219,50 +763,77 @@ class TandemQueueSimulator:
         print(f'Avg number of jobs in the system: {self.overall_mean_jobcount}')
         print(f'Mean sojourn time in system: {self.overall_mean_soujorntime}')
 
+    #external arrival rate of every queue, in tandem queues only the first one has external arrivals
+    def external_arrival_rates(self):
+        rates = np.zeros(self.num_queues)
+        rates[0] = self.arrival_rates[0]
+        return rates
+
+    #routing_matrix[i][j]: probability that a job leaving queue i goes to queue j, a tandem line always goes to i+1
+    def routing_probabilities(self):
+        return np.eye(self.num_queues, k=1)
+
     def determin_stats_with_jackson(self):
         print("\n\n\nStats using jackson formula:")
         
         print(f"system throughput:{self.jackson_system_throughput}")
 
+        #total arrival rate of every queue from the traffic equations
+        self.jackson_arrival_rates = solve_traffic_equations(self.external_arrival_rates(), self.routing_probabilities())
+
         for i in range(self.num_queues):
             print("queue", i)
-            #for tandem queue
-            self.jackson_utilization[i] = self.arrival_rates[0]/ self.service_rates[i]
+            num_servers = self.num_servers[i]
+            self.jackson_utilization[i] = self.jackson_arrival_rates[i]/ (self.service_rates[i] * num_servers)
             print(f'Utilization: {self.jackson_utilization[i]}')
 
-            self.jackson_avg_queue_length[i] = self.jackson_utilization[i] / ( 1 - self.jackson_utilization[i])
+            if num_servers == 1:
+                self.jackson_wait_probability[i] = self.jackson_utilization[i]
+                self.jackson_avg_queue_length[i] = self.jackson_utilization[i] / ( 1 - self.jackson_utilization[i])
+            else:
+                #M/M/c: jobs waiting (Erlang C) plus jobs in service
+                self.jackson_wait_probability[i] = erlang_c(num_servers, self.jackson_arrival_rates[i] / self.service_rates[i])
+                print(f'Probability of waiting (Erlang C): {self.jackson_wait_probability[i]}')
+                self.jackson_avg_queue_length[i] = (self.jackson_wait_probability[i] * self.jackson_utilization[i] / (1 - self.jackson_utilization[i])
+                                                    + self.jackson_arrival_rates[i] / self.service_rates[i])
             self.jackson_avg_jobs_in_system += self.jackson_avg_queue_length[i]
             print(f'Avg number of jobs: {self.jackson_avg_queue_length[i]}')
 
-            self.jackson_mean_sojourn_time_perqueue[i] = self.jackson_avg_queue_length[i]/self.arrival_rates[0]
+            self.jackson_mean_sojourn_time_perqueue[i] = self.jackson_avg_queue_length[i]/self.jackson_arrival_rates[i]
             print(f'Mean sojourn_time here: {self.jackson_mean_sojourn_time_perqueue[i]}')
 
-        self.jackson_mean_sojourn_time_in_system = self.jackson_avg_jobs_in_system/self.arrival_rates[0]
+        self.jackson_mean_sojourn_time_in_system = self.jackson_avg_jobs_in_system/self.jackson_system_throughput
         print(f'Avg number of jobs in the system: {self.jackson_avg_jobs_in_system}')
         print(f'Mean sojourn time in system: {self.jackson_mean_sojourn_time_in_system}')
 
 
-arrival_rates = [1.3]
-service_rates = [2.5, 3.5]
-arrival_distributions = [{'type': 'exponential', 'params': {'rate': 1.3}}]
-arrival_distributions_uniform = [{'type': 'uniform', 'params': {}}]
+#demo: verify jackson and little's formula for a basic tandem queue pair
+def main():
+    arrival_rates = [1.3]
+    service_rates = [2.5, 3.5]
+    arrival_distributions = [{'type': 'exponential', 'params': {'rate': 1.3}}]
+    arrival_distributions_uniform = [{'type': 'uniform', 'params': {}}]
+
+    service_distributions = [{'type': 'exponential', 'params': {'rate': 2.5}}, {'type': 'exponential', 'params': {'rate': 3.5}}]
+    num_jobs = 500000
+    num_queues = 2
+    # Start time
+    start_time = time.time()
+    # Run the Simulation first to verify jackson and little's formula for basic tandem queue pair
+    sim = TandemQueueSimulator(arrival_distributions, service_distributions, num_jobs, True, 2)
+    sim.run_simulation()
+    sim.calculate_statistics()
+
+    sim.print_stats()
+    sim.determin_stats_with_jackson()
 
-service_distributions = [{'type': 'exponential', 'params': {'rate': 2.5}}, {'type': 'exponential', 'params': {'rate': 3.5}}]
-num_jobs = 500000
-num_queues = 2
-# Start time
-start_time = time.time()
-# Run the Simulation first to verify jackson and little's formula for basic tandem queue pair
-sim = TandemQueueSimulator(arrival_distributions, service_distributions, num_jobs, True, 2)
-sim.run_simulation()
-sim.calculate_statistics()
+    # Start time
+    end_time = time.time()
 
-sim.print_stats()
-sim.determin_stats_with_jackson()
+    # Duration in seconds
+    duration = end_time - start_time
+    print("\n\n\nExecution time:", duration, "seconds")
 
-# Start time
-end_time = time.time()
 
-# Duration in seconds
-duration = end_time - start_time
-print("\n\n\nExecution time:", duration, "seconds")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
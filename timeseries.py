@@ -0,0 +1,108 @@
+import math
+import numpy as np
+
+
+#per queue time series in fixed simulated-time windows: row k covers [k*window, (k+1)*window) and holds
+#[window end, mean length of every queue, busy fraction (min(length, c) / c) of every queue].
+#memory is bounded by capacity rows: without a path only the last capacity windows are kept (ring buffer),
+#with a path the rows are appended to a raw float64 file every capacity windows, read it back with load_timeseries
+class TimeSeriesRecorder:
+    def __init__(self, num_queues, window, num_servers=None, capacity=4096, path=None):
+        self.num_queues = num_queues
+        self.window = window
+        self.num_servers = list(num_servers) if num_servers is not None else [1] * num_queues
+        self.capacity = capacity
+        self.path = path
+        self.rows = np.empty((capacity, 1 + 2 * num_queues))
+        #rows in the buffer (ring mode: valid rows, file mode: rows not written yet)
+        self.num_rows = 0
+        self.num_windows = 0
+        #rows in the file
+        self.rows_written = 0
+        self.window_end = window
+        self.prev_time = 0.0
+        self.length_areas = [0.0] * num_queues
+        self.busy_areas = [0.0] * num_queues
+        self.file = open(path, 'wb') if path is not None else None
+
+    #called before an event changes the queues: they had queue_lengths since the previous call
+    def advance(self, current_time, queue_lengths):
+        while current_time >= self.window_end:
+            self.add_area(self.window_end - self.prev_time, queue_lengths)
+            self.prev_time = self.window_end
+            self.close_window()
+        self.add_area(current_time - self.prev_time, queue_lengths)
+        self.prev_time = current_time
+
+    def add_area(self, time_spent, queue_lengths):
+        for i in range(self.num_queues):
+            length = queue_lengths[i]
+            self.length_areas[i] += time_spent * length
+            self.busy_areas[i] += time_spent * min(length, self.num_servers[i]) / self.num_servers[i]
+
+    def close_window(self):
+        if self.file is not None and self.num_rows == self.capacity:
+            self.flush()
+        row = self.rows[self.num_windows % self.capacity if self.file is None else self.num_rows]
+        row[0] = self.window_end
+        row[1:1 + self.num_queues] = self.length_areas
+        row[1 + self.num_queues:] = self.busy_areas
+        row[1:] /= self.window
+        self.num_rows = min(self.num_rows + 1, self.capacity)
+
+        self.num_windows += 1
+        #multiplied instead of summed, so the window ends do not drift
+        self.window_end = (self.num_windows + 1) * self.window
+        self.length_areas = [0.0] * self.num_queues
+        self.busy_areas = [0.0] * self.num_queues
+
+    #writes the buffered rows to the file (the current, incomplete window is not written)
+    def flush(self):
+        if self.file is None:
+            return
+        self.rows[:self.num_rows].tofile(self.file)
+        self.file.flush()
+        self.rows_written += self.num_rows
+        self.num_rows = 0
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    #the rows in time order: the ring buffer contents, or the whole file (memory mapped)
+    def series(self):
+        if self.file is not None:
+            self.flush()
+            return load_timeseries(self.path, self.num_queues)
+        if self.num_windows <= self.capacity:
+            return self.rows[:self.num_rows].copy()
+        start = self.num_windows % self.capacity
+        return np.concatenate((self.rows[start:], self.rows[:start]))
+
+    #checkpoints keep the path and the number of rows written. a resumed recorder cuts the file back to that,
+    #dropping the windows the interrupted run wrote after the checkpoint, and continues from there
+    def __getstate__(self):
+        self.flush()
+        state = self.__dict__.copy()
+        state['file'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path is not None:
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(self.rows_written * self.rows.shape[1] * self.rows.itemsize)
+            self.file.seek(0, 2)
+
+
+#(num_windows, 1 + 2 * num_queues) read only memory map of a TimeSeriesRecorder file
+def load_timeseries(path, num_queues):
+    values = np.memmap(path, dtype=np.float64, mode='r')
+    return values.reshape(-1, 1 + 2 * num_queues)
+
+#every stride-th row so that at most max_points rows remain, reads only those rows of a memory map
+def downsample(series, max_points=2000):
+    stride = max(1, math.ceil(len(series) / max_points))
+    return np.asarray(series[::stride])
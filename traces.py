@@ -0,0 +1,74 @@
+import itertools
+import numpy as np
+
+#trace files: a .npy array, or raw little endian float64 values (any other extension), with one row per job.
+#a 2-d trace holds several columns, e.g. inter-arrival time, service time in queue 0, service time in queue 1.
+#the distribution dict of a trace column is {'type': 'trace', 'params': {'path': ..., 'column': 0, 'offset': 0}}.
+#service times are read in the order jobs reach a station, which is the job (row) order only when jobs cannot overtake
+#each other: trace service times need single server FIFO stations (in MultiClassSimulator: FIFO within a class, no sjf)
+#and are not supported by NetworkQueueSimulator, whose routing mixes the jobs
+
+#whether a distribution dict replays a trace
+def is_trace(distribution):
+    return distribution is not None and distribution['type'] == 'trace'
+
+#memory maps opened by this process. the distribution dicts only hold the path, so they stay small to pickle
+#(process pools, checkpoints) and every process maps the file itself
+_open_traces = {}
+
+def open_trace(path):
+    trace = _open_traces.get(path)
+    if trace is None:
+        if path.endswith('.npy'):
+            trace = np.load(path, mmap_mode='r')
+        else:
+            trace = np.memmap(path, dtype=np.float64, mode='r')
+        _open_traces[path] = trace
+    return trace
+
+#rows offset + start .. offset + start + num_samples of the trace column, a view of the memory map (no copy)
+def read_trace(distribution, start, num_samples):
+    params = distribution['params']
+    trace = open_trace(params['path'])
+    first = params.get('offset', 0) + start
+    rows = trace[first:first + num_samples]
+    if trace.ndim == 2:
+        rows = rows[:, params.get('column', 0)]
+    return rows
+
+def trace_length(distribution):
+    params = distribution['params']
+    return len(open_trace(params['path'])) - params.get('offset', 0)
+
+
+#converts a CSV file to a float64 .npy trace chunk_rows rows at a time, so the CSV never has to fit in memory.
+#columns selects (and orders) the CSV columns, header_rows lines are skipped
+def csv_to_npy(csv_path, npy_path, columns=None, delimiter=',', header_rows=1, chunk_rows=1000000):
+    with open(csv_path) as f:
+        num_rows = sum(1 for line in itertools.islice(f, header_rows, None) if line.strip())
+        f.seek(0)
+        first_line = next(itertools.islice(f, header_rows, None))
+    num_columns = len(columns) if columns is not None else len(first_line.split(delimiter))
+
+    trace = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.float64, shape=(num_rows, num_columns))
+    row = 0
+    with open(csv_path) as f:
+        lines = (line for line in itertools.islice(f, header_rows, None) if line.strip())
+        while row < num_rows:
+            chunk = list(itertools.islice(lines, chunk_rows))
+            values = np.loadtxt(chunk, delimiter=delimiter, usecols=columns, ndmin=2)
+            trace[row:row + len(values)] = values
+            row += len(values)
+    trace.flush()
+    del trace
+    return npy_path
+
+
+#'empirical' distribution dict of samples (e.g. a trace column): num_quantiles quantiles at equally spaced
+#probabilities, sampled by interpolating the quantile table (times_from_uniforms).
+#at most max_samples evenly strided samples are used, a memory mapped trace is not read as a whole
+def empirical_distribution(samples, num_quantiles=1001, max_samples=10**7):
+    stride = max(1, -(-len(samples) // max_samples))
+    samples = np.asarray(samples[::stride], dtype=np.float64)
+    probs = np.linspace(0, 1, num_quantiles)
+    return {'type': 'empirical', 'params': {'probs': probs.tolist(), 'quantiles': np.quantile(samples, probs).tolist()}}